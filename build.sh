@@ -2,4 +2,7 @@
 
 pipenv run pipenv install
 python ics226/manage.py collectstatic --no-input
-python ics226/manage.py migrate
+# Migrate every game shard, which includes the default database
+for alias in $(python ics226/manage.py shell --verbosity 0 -c "from django.conf import settings; print(' '.join(settings.GAME_SHARDS))"); do
+    python ics226/manage.py migrate --database "$alias"
+done
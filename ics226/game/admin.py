@@ -1,6 +1,253 @@
+import json
+from django.conf import settings
 from django.contrib import admin
-from .models import Board, Player
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from .models import Game, Board, Player, LeaderboardEntry
+from .routers import shard_for_game, use_shard
+from .constants import BOARD_LENGTH
 
-# Register your models here.
-admin.site.register(Board)
-admin.site.register(Player)
+
+"""------------------- Estimated Counts ------------------"""
+
+# Below this many rows an exact count is cheap, so estimates are not used.
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+# The number of recent games offered by the game filter.
+RECENT_GAMES = 20
+
+
+def estimate_row_count(queryset):
+    """
+    Estimates the number of rows in a queryset's table from the planner statistics, which is
+    instant where an exact COUNT(*) would scan the whole table. Only PostgreSQL keeps these.
+    :param queryset: The queryset whose table is counted.
+    :return: The estimated number of rows, or None if no estimate is available.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] > 0 else None
+
+
+def estimate_query_count(queryset):
+    """
+    Estimates the number of rows a filtered queryset returns from the planner's row estimate for
+    its query, which is not run. Only PostgreSQL is supported.
+    :param queryset: The queryset to estimate.
+    :return: The estimated number of rows, or None if no estimate is available.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator that estimates the count of large changelists: from the table statistics when
+    unfiltered and from the query plan when filtered. Counts at or below ESTIMATED_COUNT_THRESHOLD
+    are exact.
+    """
+
+    @cached_property
+    def count(self):
+        if self.object_list.query.where:
+            estimate = estimate_query_count(self.object_list)
+        else:
+            estimate = estimate_row_count(self.object_list)
+        if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+"""----------------------- Filters -----------------------"""
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    Selects which shard's rows are listed. Without it, the default database is listed.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in settings.GAME_SHARDS]
+
+    def queryset(self, request, queryset):
+        if self.value() in settings.GAME_SHARDS:
+            return queryset.using(self.value())
+        return queryset
+
+
+class GameFilter(admin.SimpleListFilter):
+    """
+    Filters by game, offering only the most recent games of the selected shard rather than every
+    game in the table. Any other game can be selected by its id in the 'game' query parameter, and
+    is always read from its own shard.
+    """
+    title = 'game'
+    parameter_name = 'game'
+
+    def lookups(self, request, model_admin):
+        shard = request.GET.get(ShardFilter.parameter_name)
+        games = Game.objects.using(shard if shard in settings.GAME_SHARDS else None)
+        games = games.order_by('-created_at').values_list('id', flat=True)[:RECENT_GAMES]
+        return [(str(game_id), str(game_id)) for game_id in games]
+
+    def has_output(self):
+        # Kept even when the listed shard has no games, so a game id on another shard still applies
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value() is not None and self.value().isdigit():
+            return queryset.filter(game_id=self.value()).using(shard_for_game(int(self.value())))
+        return queryset
+
+
+class PositionFilter(admin.SimpleListFilter):
+    """
+    Filters by a board coordinate. The choices come from BOARD_LENGTH rather than a DISTINCT
+    query over the table. Coordinates are only indexed after the game, so the filter is offered
+    and applied only once a game is selected.
+    """
+
+    def lookups(self, request, model_admin):
+        if not request.GET.get(GameFilter.parameter_name, '').isdigit():
+            return []
+        return [(str(i), str(i)) for i in range(BOARD_LENGTH)]
+
+    def queryset(self, request, queryset):
+        if self.value() is not None and self.lookup_choices:
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class RowFilter(PositionFilter):
+    title = 'row'
+    parameter_name = 'row'
+
+
+class ColFilter(PositionFilter):
+    title = 'col'
+    parameter_name = 'col'
+
+
+class HasTreasureFilter(admin.SimpleListFilter):
+    title = 'has treasure'
+    parameter_name = 'has_treasure'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Yes'), ('no', 'No')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(value__gt=0)
+        if self.value() == 'no':
+            return queryset.filter(value=0)
+        return queryset
+
+
+"""--------------------- Model Admins --------------------"""
+
+
+def listed_database(request) -> str:
+    """
+    Returns the database a changelist reads from, as chosen by its shard and game filters.
+    :param request: The HTTP Request Object.
+    :return: A database alias.
+    """
+    game_id = request.GET.get(GameFilter.parameter_name, '')
+    if game_id.isdigit():
+        return shard_for_game(int(game_id))
+    shard = request.GET.get(ShardFilter.parameter_name)
+    return shard if shard in settings.GAME_SHARDS else 'default'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings shared by the game tables, which can hold tens of millions of rows.
+    Changelists can list any shard, but Board and Player ids are only unique within a database
+    and their change views read the default one, so rows listed from another shard are shown
+    without change links or actions.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def can_change_listed_rows(self, request) -> bool:
+        """
+        Returns whether the rows of a changelist can be opened and acted on.
+        :param request: The HTTP Request Object.
+        :return: True if the change views read the database the rows were listed from.
+        """
+        return listed_database(request) == 'default'
+
+    def get_list_display_links(self, request, list_display):
+        if not self.can_change_listed_rows(request):
+            return None
+        return super().get_list_display_links(request, list_display)
+
+    def get_actions(self, request):
+        if not self.can_change_listed_rows(request):
+            return {}
+        return super().get_actions(request)
+
+
+@admin.register(Game)
+class GameAdmin(LargeTableAdmin):
+    """
+    Game ids are unique across shards, so games keep their change links and are read from and
+    saved to the shard chosen for their id.
+    """
+    list_display = ['id', 'created_at']
+    list_filter = [ShardFilter]
+    search_fields = ['=id']
+
+    def can_change_listed_rows(self, request) -> bool:
+        return True
+
+    def get_object(self, request, object_id, from_field=None):
+        if not str(object_id).isdigit():
+            return None
+        return self.get_queryset(request).using(shard_for_game(int(object_id))).filter(id=object_id).first()
+
+    def get_deleted_objects(self, objs, request):
+        # Collect the games' boards and players from the database the games were read from
+        alias = objs.db if isinstance(objs, QuerySet) else next((obj._state.db for obj in objs), None)
+        with use_shard(alias):
+            return super().get_deleted_objects(objs, request)
+
+
+@admin.register(Board)
+class BoardAdmin(LargeTableAdmin):
+    list_display = ['__str__', 'game', 'row', 'col', 'value', 'player']
+    list_select_related = ['game', 'player']
+    list_filter = [ShardFilter, GameFilter, RowFilter, ColFilter, HasTreasureFilter]
+    search_fields = ['=player__name']
+    raw_id_fields = ['game', 'player']
+
+
+@admin.register(Player)
+class PlayerAdmin(LargeTableAdmin):
+    list_display = ['name', 'game', 'score', 'row', 'col']
+    list_select_related = ['game']
+    list_filter = [ShardFilter, GameFilter]
+    search_fields = ['=name']
+    raw_id_fields = ['game']
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(LargeTableAdmin):
+    list_display = ['name', 'total_treasure', 'games_played', 'best_score']
+    search_fields = ['=name']
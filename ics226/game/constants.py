@@ -12,4 +12,7 @@ DOWN = 'DOWN'
 LEFT = 'LEFT'
 RIGHT = 'RIGHT'
 
-TILE = '.'
\ No newline at end of file
+TILE = '.'
+
+LEADERBOARD_PAGE_SIZE = 10
+MAX_LEADERBOARD_PAGE_SIZE = 100
@@ -0,0 +1,185 @@
+# game/export.py
+import csv
+import json
+from datetime import datetime, time, timezone
+from django.conf import settings
+from django.utils.timezone import is_aware, make_aware
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Game, Board, Player
+from .routers import replica_for
+from .constants import BOARD_LENGTH, TILE
+
+
+"""------------------- Reading Games ---------------------"""
+
+EXPORT_CHUNK_SIZE = 500
+
+CSV_HEADER = ['game_id', 'created_at', 'finished', 'player', 'score', 'row', 'col', 'board']
+
+
+def get_board_snapshot(tiles, player_names) -> [str]:
+    """
+    Draws a game-board as one string per row, using the same symbols as the game views.
+    :param tiles: Every Board of a single game.
+    :param player_names: A dict mapping player ids to player names.
+    :return: A list of BOARD_LENGTH strings of BOARD_LENGTH symbols each.
+    """
+    grid = [[TILE] * BOARD_LENGTH for _ in range(BOARD_LENGTH)]
+    for tile in tiles:
+        if tile.player_id is not None:
+            grid[tile.row][tile.col] = player_names[tile.player_id]
+        elif tile.value > 0:
+            grid[tile.row][tile.col] = '$'
+        else:
+            grid[tile.row][tile.col] = tile.label
+    return [''.join(row) for row in grid]
+
+
+def filter_games(games, since=None, until=None, min_game_id=None, max_game_id=None):
+    """
+    Restricts a Game queryset to a creation date range and a game id range. Game ids are random,
+    so only the date range can pick out the games created since a previous export.
+    :param games: The Game queryset to filter.
+    :param since: Only include games created at or after this datetime.
+    :param until: Only include games created before this datetime.
+    :param min_game_id: Only include games with an id at least this large.
+    :param max_game_id: Only include games with an id at most this large.
+    :return: The filtered queryset.
+    """
+    if since is not None:
+        games = games.filter(created_at__gte=since)
+    if until is not None:
+        games = games.filter(created_at__lt=until)
+    if min_game_id is not None:
+        games = games.filter(id__gte=min_game_id)
+    if max_game_id is not None:
+        games = games.filter(id__lte=max_game_id)
+    return games
+
+
+def parse_export_datetime(value):
+    """
+    Parses an ISO date or datetime used to filter an export. Dates mean midnight UTC and naive
+    datetimes are taken as UTC.
+    :param value: The string to parse, or None.
+    :return: An aware datetime, or None if value is empty.
+    :raises ValueError if value is not an ISO date or datetime.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f'Invalid date: {value}')
+        parsed = datetime.combine(date, time.min)
+    return parsed if is_aware(parsed) else make_aware(parsed, timezone.utc)
+
+
+def parse_export_filters(since=None, until=None, min_game_id=None, max_game_id=None) -> dict:
+    """
+    Parses the optional date and game id range filters of an export.
+    :return: A dict of keyword arguments for iter_game_records.
+    :raises ValueError if a filter is malformed.
+    """
+    try:
+        min_game_id = int(min_game_id) if min_game_id else None
+        max_game_id = int(max_game_id) if max_game_id else None
+    except ValueError:
+        raise ValueError('Game ids must be integers')
+
+    return {
+        'since': parse_export_datetime(since),
+        'until': parse_export_datetime(until),
+        'min_game_id': min_game_id,
+        'max_game_id': max_game_id,
+    }
+
+
+def iter_game_records(since=None, until=None, min_game_id=None, max_game_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields one record per game with its players, scores and final board. Games are read shard
+    by shard, from a replica where one is configured, in chunks of chunk_size games ordered by id,
+    so only one chunk of games, players and tiles is held in memory at a time.
+    :param since: Only include games created at or after this datetime.
+    :param until: Only include games created before this datetime.
+    :param min_game_id: Only include games with an id at least this large.
+    :param max_game_id: Only include games with an id at most this large.
+    :param chunk_size: The number of games read per query.
+    :return: A generator of dicts that can be serialized as JSON.
+    """
+    for shard in settings.GAME_SHARDS:
+        alias = replica_for(shard)
+        games = filter_games(Game.objects.using(alias), since, until, min_game_id, max_game_id).order_by('id')
+        last_id = None
+
+        while True:
+            chunk = games if last_id is None else games.filter(id__gt=last_id)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            players_by_game, tiles_by_game = {}, {}
+            for player in Player.objects.using(alias).filter(game__in=chunk).order_by('name').iterator():
+                players_by_game.setdefault(player.game_id, []).append(player)
+            for tile in Board.objects.using(alias).filter(game__in=chunk).iterator():
+                tiles_by_game.setdefault(tile.game_id, []).append(tile)
+
+            for game in chunk:
+                players = players_by_game.get(game.id, [])
+                tiles = tiles_by_game.get(game.id, [])
+                player_names = {player.id: player.name for player in players}
+                yield {
+                    'game_id': game.id,
+                    'created_at': game.created_at.isoformat(),
+                    'finished': not any(tile.value > 0 for tile in tiles),
+                    'players': [{'name': player.name, 'score': player.score, 'row': player.row, 'col': player.col}
+                                for player in players],
+                    'board': get_board_snapshot(tiles, player_names),
+                }
+
+
+"""---------------------- Formats ------------------------"""
+
+
+class Echo:
+    """
+    A file-like object that returns what is written to it, so csv.writer can produce lines
+    one at a time for a streamed response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_ndjson(records):
+    """
+    Serializes records as newline-delimited JSON.
+    :param records: An iterable of game records.
+    :return: A generator of lines.
+    """
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+def render_csv(records):
+    """
+    Serializes records as CSV with one row per player. The board is written as its rows
+    joined by '/'.
+    :param records: An iterable of game records.
+    :return: A generator of lines.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for record in records:
+        board = '/'.join(record['board'])
+        for player in record['players']:
+            yield writer.writerow([record['game_id'], record['created_at'], record['finished'],
+                                   player['name'], player['score'], player['row'], player['col'], board])
+
+
+EXPORT_FORMATS = {
+    'ndjson': (render_ndjson, 'application/x-ndjson'),
+    'csv': (render_csv, 'text/csv'),
+}
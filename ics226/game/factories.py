@@ -0,0 +1,50 @@
+# game/factories.py
+from random import Random
+from django.db import transaction
+from .models import Game, Board, Player
+from .routers import shard_for_game, use_game_shard
+from .constants import BOARD_LENGTH, NUM_TREASURES, MIN_TREASURE, MAX_TREASURE, PLAYER_ONE_NAME, PLAYER_TWO_NAME, TILE
+
+
+"""----------------- Seeded Game Boards -----------------"""
+
+
+def generate_layout(rng) -> (dict, dict):
+    """
+    Lays out a game-board with the same rules as create_game: treasures and players sit on
+    distinct random tiles, and every treasure has a positive value between MIN_TREASURE and
+    MAX_TREASURE.
+    :param rng: The random.Random instance to draw from.
+    :return: A dict mapping (row, col) to treasure value, and a dict mapping player names to (row, col).
+    """
+    names = [PLAYER_ONE_NAME, PLAYER_TWO_NAME]
+    tiles = [divmod(tile, BOARD_LENGTH) for tile in rng.sample(range(BOARD_LENGTH * BOARD_LENGTH), NUM_TREASURES + len(names))]
+    treasures = {position: rng.randint(max(MIN_TREASURE, 1), MAX_TREASURE) for position in tiles[:NUM_TREASURES]}
+    players = dict(zip(names, tiles[NUM_TREASURES:]))
+    return treasures, players
+
+
+def build_game(seed=None, game_id=None) -> Game:
+    """
+    Builds a complete game directly in the database: the Game, its Players, and every Board in a
+    single bulk insert. The same seed always produces the same layout, which makes boards
+    reproducible in tests and benchmarks; the game id is still random so seeded games can coexist.
+    :param seed: The seed for the layout, or None for a random layout.
+    :param game_id: The id for the game, or None for a random id.
+    :return: The saved Game.
+    """
+    treasures, player_positions = generate_layout(Random(seed))
+    game = Game.create_game() if game_id is None else Game(id=game_id)
+
+    with use_game_shard(game.id), transaction.atomic(using=shard_for_game(game.id)):
+        game.save()
+        players = Player.objects.bulk_create([Player.create_player(game, name, row, col)
+                                              for name, (row, col) in player_positions.items()])
+        players_by_position = {(player.row, player.col): player for player in players}
+
+        Board.objects.bulk_create([
+            Board(game=game, label=TILE, row=row, col=col, value=treasures.get((row, col), 0),
+                  player=players_by_position.get((row, col)))
+            for row in range(BOARD_LENGTH) for col in range(BOARD_LENGTH)
+        ])
+    return game
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from game.export import EXPORT_FORMATS, iter_game_records, parse_export_filters
+
+
+class Command(BaseCommand):
+    help = 'Streams every game with its players, scores and final board as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--since', help='Only export games created at or after this ISO date or datetime.')
+        parser.add_argument('--until', help='Only export games created before this ISO date or datetime.')
+        parser.add_argument('--min-game-id', help='Only export games with an id at least this large.')
+        parser.add_argument('--max-game-id', help='Only export games with an id at most this large.')
+        parser.add_argument('--output', help='Write to this file instead of standard output.')
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_export_filters(options['since'], options['until'],
+                                           options['min_game_id'], options['max_game_id'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        render_records, _ = EXPORT_FORMATS[options['format']]
+        lines = render_records(iter_game_records(**filters))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
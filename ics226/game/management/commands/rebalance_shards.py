@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from game.models import Game, Board, Player
+from game.routers import shard_for_game, primary_for
+
+
+def databases_with_games() -> [str]:
+    """
+    Returns the alias of every configured primary database that has the game tables, including
+    databases that are no longer listed in GAME_SHARDS.
+    :return: A list of database aliases.
+    """
+    return [alias for alias in connections if primary_for(alias) == alias
+            and Game._meta.db_table in connections[alias].introspection.table_names()]
+
+
+def move_game(game_id, source, target) -> None:
+    """
+    Copies a game with its players and tiles from the source database to the target database,
+    then deletes it from the source. The copy is committed on the target before the source is
+    touched, so a failure at any point leaves the game on at least one database. A copy left on
+    the target by an interrupted earlier run is replaced, so the move can safely be retried.
+    :param game_id: The id of the game to move.
+    :param source: The alias of the database the game is currently stored in.
+    :param target: The alias of the database the game belongs in.
+    """
+    with transaction.atomic(using=target):
+        game = Game.objects.using(source).get(id=game_id)
+        players = list(Player.objects.using(source).filter(game=game))
+        tiles = list(Board.objects.using(source).filter(game=game))
+
+        Game.objects.using(target).filter(id=game_id).delete()
+        Game(id=game.id).save(using=target, force_insert=True)
+        Game.objects.using(target).filter(id=game_id).update(created_at=game.created_at)
+
+        # Player and Board ids are only unique within a database, so new ids are assigned
+        new_player_ids = {}
+        for player in players:
+            old_id = player.pk
+            player.pk = None
+            player._state.adding = True
+            player.save(using=target)
+            new_player_ids[old_id] = player.pk
+
+        for tile in tiles:
+            tile.pk = None
+            tile.player_id = new_player_ids.get(tile.player_id)
+        Board.objects.using(target).bulk_create(tiles)
+
+    with transaction.atomic(using=source):
+        Game.objects.using(source).filter(id=game_id).delete()
+
+
+class Command(BaseCommand):
+    help = 'Moves every game that is not stored on the shard chosen for its id onto that shard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the moves without making them.')
+
+    def handle(self, *args, **options):
+        moved = 0
+        for source in databases_with_games():
+            game_ids = Game.objects.using(source).values_list('id', flat=True).iterator()
+            moves = [(game_id, shard_for_game(game_id)) for game_id in game_ids if shard_for_game(game_id) != source]
+
+            for game_id, target in moves:
+                self.stdout.write(f'Game {game_id}: {source} -> {target}')
+                if not options['dry_run']:
+                    move_game(game_id, source, target)
+                moved += 1
+
+        verb = 'would be moved' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(f'{moved} game(s) {verb}.'))
@@ -0,0 +1,41 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from game.constants import BOARD_LENGTH, NUM_TREASURES, MIN_TREASURE, MAX_TREASURE
+from game.simulation import POLICIES, simulate_games, summarize
+
+
+def format_stats(stats) -> str:
+    return ', '.join(f'{name} {value:.2f}' for name, value in stats.items()) or 'n/a'
+
+
+class Command(BaseCommand):
+    help = 'Plays many simulated games with bot policies and reports score and game-length statistics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=10000, help='The number of games to simulate.')
+        parser.add_argument('--policies', nargs='+', choices=POLICIES, default=['greedy', 'greedy'],
+                            help='The policy of each player, which also sets the number of players.')
+        parser.add_argument('--max-turns', type=int, default=1000, help='Turns after which a game is stopped.')
+        parser.add_argument('--seed', type=int, help='Seed for reproducible runs.')
+        parser.add_argument('--board-length', type=int, default=BOARD_LENGTH)
+        parser.add_argument('--num-treasures', type=int, default=NUM_TREASURES)
+        parser.add_argument('--min-treasure', type=int, default=MIN_TREASURE)
+        parser.add_argument('--max-treasure', type=int, default=MAX_TREASURE)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        try:
+            results = simulate_games(options['games'], options['policies'], options['max_turns'], options['seed'],
+                                     options['board_length'], options['num_treasures'],
+                                     options['min_treasure'], options['max_treasure'])
+        except ValueError as error:
+            raise CommandError(error)
+        summary = summarize(results)
+        elapsed = perf_counter() - start
+
+        self.stdout.write(f"{summary['games']} games in {elapsed:.2f}s")
+        self.stdout.write(f"Finished: {summary['finished_rate']:.1%}, ties: {summary['tie_rate']:.1%}")
+        for i, (policy, player) in enumerate(zip(options['policies'], summary['players']), start=1):
+            self.stdout.write(f"Player {i} ({policy}): win rate {player['win_rate']:.1%}; "
+                              f"score {format_stats(player['score'])}")
+        self.stdout.write(f"Turns of finished games: {format_stats(summary['turns'])}")
@@ -0,0 +1,47 @@
+# game/middleware.py
+from contextlib import ExitStack
+from time import perf_counter
+from django.conf import settings
+from django.db import connections
+
+
+class ServerTimingMiddleware:
+    """
+    Measures each request and reports it in a Server-Timing response header: the total time, the
+    time and number of database queries, and how many of those queries went to the session table.
+    Enabled with GAME_SERVER_TIMING; it should be listed first in MIDDLEWARE so that the session
+    middleware's own reads and writes are included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.GAME_SERVER_TIMING:
+            return self.get_response(request)
+
+        timings = {'db': 0.0, 'queries': 0, 'session_queries': 0}
+
+        def record_query(execute, sql, params, many, context):
+            start = perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings['db'] += perf_counter() - start
+                timings['queries'] += 1
+                if 'django_session' in sql:
+                    timings['session_queries'] += 1
+
+        start = perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record_query))
+            response = self.get_response(request)
+        total = perf_counter() - start
+
+        response['Server-Timing'] = (
+            f'total;dur={total * 1000:.2f}, '
+            f'db;dur={timings["db"] * 1000:.2f};desc="{timings["queries"]} queries", '
+            f'session;desc="{timings["session_queries"]} queries"'
+        )
+        return response
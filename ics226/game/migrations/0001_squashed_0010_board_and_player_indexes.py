@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:42
+
+import django.db.models.deletion
+import game.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Squashes 0001 to 0010 into the final schema. Databases being created from scratch have no
+    rows left from before games were stored side by side, so the data step of 0009 is not needed.
+    """
+
+    replaces = [
+        ('game', '0001_initial'),
+        ('game', '0002_player_col_player_tag'),
+        ('game', '0003_remove_player_column_remove_player_name_and_more'),
+        ('game', '0004_rename_column_board_col_remove_player_tag_and_more'),
+        ('game', '0005_board_player_alter_player_score'),
+        ('game', '0006_alter_player_col_alter_player_name_alter_player_row'),
+        ('game', '0007_alter_board_col_alter_board_row_alter_player_score'),
+        ('game', '0008_leaderboardentry'),
+        ('game', '0009_game_board_game_player_game'),
+        ('game', '0010_board_and_player_indexes'),
+    ]
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Game',
+            fields=[
+                ('id', models.BigIntegerField(editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Player',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.IntegerField(validators=[game.models.validate_row_range])),
+                ('col', models.IntegerField(validators=[game.models.validate_col_range])),
+                ('name', models.CharField(max_length=1)),
+                ('score', models.IntegerField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='players', to='game.game')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'name'), name='unique_player_name_per_game')],
+                'indexes': [models.Index(fields=['name'], name='player_name_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Board',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=1)),
+                ('row', models.IntegerField(validators=[game.models.validate_row_range])),
+                ('col', models.IntegerField(validators=[game.models.validate_col_range])),
+                ('value', models.IntegerField()),
+                ('player', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='game.player')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiles', to='game.game')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['game', 'row', 'col'], name='board_position_idx'),
+                    models.Index(condition=models.Q(('value__gt', 0)), fields=['game'], name='board_treasure_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1, unique=True)),
+                ('total_treasure', models.IntegerField(default=0)),
+                ('games_played', models.IntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-total_treasure', 'name'],
+                'indexes': [models.Index(fields=['-total_treasure', 'name'], name='leaderboard_rank_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_alter_board_col_alter_board_row_alter_player_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1, unique=True)),
+                ('total_treasure', models.IntegerField(default=0)),
+                ('games_played', models.IntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-total_treasure', 'name'],
+                'indexes': [models.Index(fields=['-total_treasure', 'name'], name='leaderboard_rank_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:02
+
+from random import getrandbits
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_existing_rows_to_game(apps, schema_editor):
+    """
+    Before games were stored side by side, the database held a single game. Any Boards and
+    Players left from it are attached to one Game so they survive the new non-null game column.
+    """
+    db_alias = schema_editor.connection.alias
+    Game = apps.get_model('game', 'Game')
+    Board = apps.get_model('game', 'Board')
+    Player = apps.get_model('game', 'Player')
+
+    if not Board.objects.using(db_alias).exists() and not Player.objects.using(db_alias).exists():
+        return
+
+    game = Game.objects.using(db_alias).create(id=getrandbits(62) + 1)
+    Board.objects.using(db_alias).update(game=game)
+    Player.objects.using(db_alias).update(game=game)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Game',
+            fields=[
+                ('id', models.BigIntegerField(editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='board',
+            name='game',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tiles', to='game.game'),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='game',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='players', to='game.game'),
+        ),
+        migrations.RunPython(assign_existing_rows_to_game, migrations.RunPython.noop, hints={'model_name': 'game'}),
+        migrations.AlterField(
+            model_name='board',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiles', to='game.game'),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='players', to='game.game'),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='name',
+            field=models.CharField(max_length=1),
+        ),
+        migrations.AddConstraint(
+            model_name='player',
+            constraint=models.UniqueConstraint(fields=('game', 'name'), name='unique_player_name_per_game'),
+        ),
+    ]
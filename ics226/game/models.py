@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.core.exceptions import ValidationError
+from random import getrandbits
 from .constants import TILE
 
 
@@ -26,7 +29,8 @@ def validate_row_range(value) -> None:
 
 def validate_unique_name(value):
     """
-    Ensures that each new player has a unique name
+    Ensures that each new player has a unique name. Players are now unique per game through
+    a constraint on Player; this validator is kept because earlier migrations reference it.
     :raises ValidationError if player name is already in use.
     """
     players = Player.objects.filter(name=value)
@@ -34,22 +38,58 @@ def validate_unique_name(value):
         raise ValidationError('Name already taken', code='duplicate')
 
 
+"""__________________ GAME CLASS _________________"""
+
+
+class Game(models.Model):
+    """
+    A Game groups the Boards and Players of a single play-through. Game ids are generated rather
+    than auto-incremented so that they are unique across every database a game may be stored in.
+    """
+    id = models.BigIntegerField(primary_key=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @staticmethod
+    def new_id() -> int:
+        """
+        Generates a random positive id for a new Game.
+        :return: An integer that fits in a signed 64-bit column.
+        """
+        return getrandbits(62) + 1
+
+    @classmethod
+    def create_game(cls):
+        return cls(id=cls.new_id())
+
+    def __str__(self):
+        return str(self.id)
+
+
 """_________________ PLAYER CLASS ________________"""
 
 
 class Player(models.Model):
     """
-    A player has a unique name and is places on the board at a specific row and col value. A
-    player also has a score.
+    A player has a name that is unique within its game and is places on the board at a specific
+    row and col value. A player also has a score.
     """
-    name = models.CharField(max_length=1, validators=[validate_unique_name])
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='players')
+    name = models.CharField(max_length=1)
     row = models.IntegerField(validators=[validate_row_range])
     col = models.IntegerField(validators=[validate_col_range])
     score = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'name'], name='unique_player_name_per_game'),
+        ]
+        indexes = [
+            models.Index(fields=['name'], name='player_name_idx'),
+        ]
+
     @classmethod
-    def create_player(cls, name, row, col):
-        return cls(name=name, row=row, col=col, score=0)
+    def create_player(cls, game, name, row, col):
+        return cls(game=game, name=name, row=row, col=col, score=0)
 
     def __str__(self):
         return self.name
@@ -63,15 +103,22 @@ class Board(models.Model):
     A Board represents a single tile (row, col coordinate) on the game-board. The Game-board
     is made up of a collection of Boards which can contain a player, a treasure or neither.
     """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='tiles')
     label = models.CharField(max_length=1)
     row = models.IntegerField(validators=[validate_row_range])
     col = models.IntegerField(validators=[validate_col_range])
     value = models.IntegerField()
     player = models.ForeignKey(Player, null=True, blank=True, on_delete=models.SET_NULL)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['game', 'row', 'col'], name='board_position_idx'),
+            models.Index(fields=['game'], condition=Q(value__gt=0), name='board_treasure_idx'),
+        ]
+
     @classmethod
-    def create_board(cls, row, col):
-        model = cls(label=TILE, row=row, col=col, value=0)
+    def create_board(cls, game, row, col):
+        model = cls(game=game, label=TILE, row=row, col=col, value=0)
         return model
 
     def __str__(self):
@@ -81,3 +128,77 @@ class Board(models.Model):
             return '$'
         else:
             return str(self.label)
+
+
+"""_______________ LEADERBOARD CLASS ______________"""
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A LeaderboardEntry holds the running totals of a player seat ('1' or '2') across every game.
+    Players have no identity beyond the seat they pick, so the leaderboard ranks seats rather than
+    people, summing whoever played from each seat. Totals are updated incrementally as treasure is
+    collected and as games end, so the leaderboard never has to be recomputed from the Player table.
+    """
+    name = models.CharField(max_length=1, unique=True)
+    total_treasure = models.IntegerField(default=0)
+    games_played = models.IntegerField(default=0)
+    best_score = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-total_treasure', 'name']
+        indexes = [
+            models.Index(fields=['-total_treasure', 'name'], name='leaderboard_rank_idx'),
+        ]
+
+    @classmethod
+    def add_treasure(cls, name, treasure) -> None:
+        """
+        Adds collected treasure to a player's running total.
+        :param name: The name of the player who collected the treasure.
+        :param treasure: The value of the treasure collected.
+        """
+        cls.objects.get_or_create(name=name)
+        cls.objects.filter(name=name).update(total_treasure=F('total_treasure') + treasure)
+
+    @classmethod
+    def record_game(cls, name, score) -> None:
+        """
+        Records the end of a game for a player, counting the game and keeping their best score.
+        :param name: The name of the player whose game ended.
+        :param score: The player's final score in the game.
+        """
+        cls.objects.get_or_create(name=name)
+        cls.objects.filter(name=name).update(games_played=F('games_played') + 1,
+                                             best_score=Greatest(F('best_score'), score))
+
+    @classmethod
+    def top(cls, limit, after=None):
+        """
+        Returns a page of the leaderboard ordered from the highest total treasure down. Pages are
+        keyed on the last entry of the previous page rather than an offset so that deep pages
+        are served straight from the rank index.
+        :param limit: The maximum number of entries to return.
+        :param after: The last LeaderboardEntry of the previous page, or None for the first page.
+        :return: A list of at most limit LeaderboardEntry objects.
+        """
+        entries = cls.objects.all()
+        if after is not None:
+            entries = entries.filter(Q(total_treasure__lt=after.total_treasure) |
+                                     Q(total_treasure=after.total_treasure, name__gt=after.name))
+        return list(entries[:limit])
+
+    def rank(self) -> int:
+        """
+        Returns the 1-based position of this entry on the leaderboard. The entries ahead are
+        counted as two ranges of the rank index, those with more treasure and those tied on
+        treasure with an earlier name, rather than one OR predicate the index cannot serve. Each
+        count is an index range scan, so the cost grows with the rank rather than the table.
+        :return: The number of entries ranked ahead of this one, plus one.
+        """
+        more_treasure = LeaderboardEntry.objects.filter(total_treasure__gt=self.total_treasure)
+        tied_ahead = LeaderboardEntry.objects.filter(total_treasure=self.total_treasure, name__lt=self.name)
+        return more_treasure.count() + tied_ahead.count() + 1
+
+    def __str__(self):
+        return self.name
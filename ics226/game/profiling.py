@@ -0,0 +1,115 @@
+# game/profiling.py
+import cProfile
+import pstats
+import re
+from hmac import compare_digest
+from pathlib import Path
+from random import random
+from time import time
+from uuid import uuid4
+from django.conf import settings
+
+
+"""------------------- Taking Profiles -------------------"""
+
+PROFILE_HEADER = 'HTTP_X_GAME_PROFILE'
+
+# Views that are never profiled, such as the page that lists the profiles.
+UNPROFILED_VIEWS = {'profiles'}
+
+
+def should_profile(request) -> bool:
+    """
+    Decides whether to profile a request: always when it carries an X-Game-Profile header
+    matching GAME_PROFILE_SECRET, otherwise for a random GAME_PROFILE_SAMPLE_RATE share of requests.
+    :param request: The HTTP Request Object.
+    :return: True if the request should be profiled.
+    """
+    header = request.META.get(PROFILE_HEADER)
+    # Headers arrive decoded as latin-1, and compare_digest only accepts ASCII strings, so bytes are compared
+    if header and settings.GAME_PROFILE_SECRET and compare_digest(header.encode('latin-1'), settings.GAME_PROFILE_SECRET.encode()):
+        return True
+    return random() < settings.GAME_PROFILE_SAMPLE_RATE
+
+
+def save_profile(profiler, endpoint) -> Path:
+    """
+    Writes a profile to GAME_PROFILE_DIR and deletes the oldest profiles beyond GAME_PROFILE_MAX_FILES.
+    :param profiler: The finished cProfile.Profile.
+    :param endpoint: The url name of the profiled view.
+    :return: The path of the written profile.
+    """
+    directory = Path(settings.GAME_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{int(time() * 1000)}-{endpoint}-{uuid4().hex[:8]}.prof'
+    profiler.dump_stats(path)
+
+    profiles = sorted(directory.glob('*.prof'), key=lambda profile: profile.name, reverse=True)
+    for old_profile in profiles[settings.GAME_PROFILE_MAX_FILES:]:
+        old_profile.unlink(missing_ok=True)
+    return path
+
+
+class ProfilingMiddleware:
+    """
+    Runs sampled or requested game views under cProfile and stores their profiles on local disk.
+    It should be listed last in MIDDLEWARE so that every other middleware's process_view runs first.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match is None or match.namespace != 'game' or match.url_name in UNPROFILED_VIEWS:
+            return None
+        if not should_profile(request):
+            return None
+
+        # The profile is saved even when the view raises, since failing requests are worth diagnosing
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(view_func, request, *view_args, **view_kwargs)
+        finally:
+            save_profile(profiler, match.url_name)
+
+
+"""------------------ Reading Profiles -------------------"""
+
+# Profile names written by save_profile: milliseconds, url name and a random suffix.
+PROFILE_NAME = re.compile(r'\d+-(?P<endpoint>\w+)-[0-9a-f]{8}')
+
+
+def get_hot_functions(paths, limit) -> [dict]:
+    """
+    Combines profiles and returns the functions that spent the most time in their own code.
+    :param paths: The profile files to combine.
+    :param limit: The number of functions to return.
+    :return: A list of dicts with the function, its call count and its own and cumulative time.
+    """
+    stats = pstats.Stats(*[str(path) for path in paths])
+    hot = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [{'function': pstats.func_std_string(function), 'calls': calls, 'own_time': own_time,
+             'cumulative_time': cumulative_time}
+            for function, (_, calls, own_time, cumulative_time, _) in hot]
+
+
+def summarize_profiles(limit=15) -> [dict]:
+    """
+    Groups the stored profiles by endpoint and finds the hot functions of each. Files whose names
+    were not written by save_profile are skipped.
+    :param limit: The number of hot functions to report per endpoint.
+    :return: A list with one dict per endpoint, holding its profile count and hot functions.
+    """
+    by_endpoint = {}
+    for path in Path(settings.GAME_PROFILE_DIR).glob('*.prof'):
+        match = PROFILE_NAME.fullmatch(path.stem)
+        if match is None:
+            continue
+        by_endpoint.setdefault(match['endpoint'], []).append(path)
+
+    return [{'endpoint': endpoint, 'profiles': len(paths), 'hot_functions': get_hot_functions(paths, limit)}
+            for endpoint, paths in sorted(by_endpoint.items())]
@@ -0,0 +1,93 @@
+# game/ratelimit.py
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+"""-------------------- Token Bucket ---------------------"""
+
+
+def take_token(tokens, updated_at, rate, burst, now) -> (float, float):
+    """
+    Refills a token bucket for the time since it was last updated and takes one token from it.
+    :param tokens: The number of tokens in the bucket when it was last updated.
+    :param updated_at: When the bucket was last updated, in seconds.
+    :param rate: The number of tokens added per second.
+    :param burst: The capacity of the bucket.
+    :param now: The current time, in seconds.
+    :return: The tokens left in the bucket, and 0 if a token was taken or otherwise the number
+             of seconds until one will be available.
+    """
+    tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class LocalBucketBackend:
+    """
+    Keeps token buckets in the memory of the current process. Only the most recently used
+    max_buckets buckets are kept; an evicted bucket starts full again.
+    """
+
+    def __init__(self, max_buckets=100000):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def take(self, key, rate, burst, now) -> float:
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(key, (burst, now))
+            tokens, wait = take_token(tokens, updated_at, rate, burst, now)
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class CacheBucketBackend:
+    """
+    Keeps token buckets in the default Django cache so that every process shares them. Reading
+    and writing a bucket is not atomic, so concurrent requests may occasionally both be allowed.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, key, rate, burst, now) -> float:
+        cache_key = f'game:move_bucket:{key}'
+        tokens, updated_at = self.cache.get(cache_key, (burst, now))
+        tokens, wait = take_token(tokens, updated_at, rate, burst, now)
+        self.cache.set(cache_key, (tokens, now), timeout=int(burst / rate) + 1)
+        return wait
+
+
+"""-------------------- Limiting Moves -------------------"""
+
+_backends = {}
+
+
+def get_backend():
+    """
+    Returns the bucket backend named by GAME_MOVE_RATE_LIMIT_BACKEND, created once per process.
+    :return: A backend with a take(key, rate, burst, now) method.
+    """
+    path = settings.GAME_MOVE_RATE_LIMIT_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def wait_before_move(game_id, player_name) -> float:
+    """
+    Takes a token from the player's bucket for one move.
+    :param game_id: The id of the game being played.
+    :param player_name: The name of the player moving.
+    :return: 0 if the move may go ahead, otherwise the number of seconds until it may.
+    """
+    if settings.GAME_MOVE_RATE is None:
+        return 0.0
+    return get_backend().take(f'{game_id}:{player_name}', settings.GAME_MOVE_RATE, settings.GAME_MOVE_BURST, time())
@@ -0,0 +1,193 @@
+# game/routers.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from hashlib import blake2b
+from random import choice
+from time import time
+from django.conf import settings
+
+
+"""------------------- Choosing a Shard -------------------"""
+
+# Models whose rows belong to a single game and are therefore stored on that game's shard.
+SHARDED_MODELS = {'game', 'board', 'player'}
+
+_current_shard = ContextVar('current_shard', default=None)
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# Cookie holding the time until which a client that just wrote to a game reads from the primary.
+PRIMARY_PIN_COOKIE = 'game_primary_pin'
+
+
+def shard_weight(alias, game_id) -> int:
+    """
+    Computes a stable pseudo-random weight for placing a game on a shard.
+    :param alias: The database alias of the shard.
+    :param game_id: The id of the game being placed.
+    :return: A 64-bit integer derived from the alias and game id.
+    """
+    digest = blake2b(f'{alias}:{game_id}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def shard_for_game(game_id) -> str:
+    """
+    Returns the database alias that stores the given game. Shards are chosen by rendezvous
+    hashing, so adding a shard only moves the games that now belong on the new shard.
+    :param game_id: The id of the game.
+    :return: The database alias from settings.GAME_SHARDS that the game is stored in.
+    """
+    return max(settings.GAME_SHARDS, key=lambda alias: shard_weight(alias, game_id))
+
+
+@contextmanager
+def use_shard(alias):
+    """
+    Routes every query for game data made inside the block to the given database.
+    :param alias: The database alias to use, or None to leave routing unchanged.
+    """
+    token = _current_shard.set(alias or _current_shard.get())
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+@contextmanager
+def use_game_shard(game_id):
+    """
+    Routes every query for game data made inside the block to the shard that stores game_id.
+    :param game_id: The id of the game being worked on.
+    """
+    with use_shard(shard_for_game(game_id)):
+        yield
+
+
+"""------------------- Read Replicas ---------------------"""
+
+
+def primary_for(alias) -> str:
+    """
+    Returns the primary database that the given alias replicates, or the alias itself if it is
+    not a replica.
+    :param alias: A database alias.
+    :return: The alias of the primary database.
+    """
+    for primary, replicas in settings.GAME_REPLICAS.items():
+        if alias in replicas:
+            return primary
+    return alias
+
+
+def replica_for(alias) -> str:
+    """
+    Returns a replica of the given primary database, or the primary itself if it has none.
+    :param alias: The alias of a primary database.
+    :return: A database alias to read from.
+    """
+    replicas = settings.GAME_REPLICAS.get(alias)
+    return choice(replicas) if replicas else alias
+
+
+def pin_to_primary(response) -> None:
+    """
+    Sends the client's reads to the primary for GAME_REPLICA_PIN_SECONDS so that it sees its own
+    writes even while the replicas are catching up.
+    :param response: The HTTP Response sent after the write.
+    """
+    pinned_until = time() + settings.GAME_REPLICA_PIN_SECONDS
+    response.set_cookie(PRIMARY_PIN_COOKIE, str(pinned_until), max_age=settings.GAME_REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(request) -> bool:
+    """
+    Checks whether the client recently wrote to a game and must read from the primary.
+    :param request: The HTTP Request Object.
+    :return: True if the client is pinned to the primary, False otherwise.
+    """
+    try:
+        return float(request.COOKIES.get(PRIMARY_PIN_COOKIE, 0)) > time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """
+    Allows game reads made inside the block to be served by a replica of the game's shard.
+    :param enabled: False to keep reads on the primary, e.g. for a pinned client.
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_game_replica(view):
+    """
+    Decorates a read-only view that takes a game_id so that its game queries are routed to a
+    replica of that game's shard, unless the client is pinned to the primary. The view must not
+    make locking reads, as it does not run inside a transaction.
+    :param view: The view function to wrap.
+    :return: The wrapped view function.
+    """
+    @wraps(view)
+    def wrapper(request, game_id, *args, **kwargs):
+        with use_game_shard(game_id), use_replicas(not is_pinned_to_primary(request)):
+            return view(request, game_id, *args, **kwargs)
+    return wrapper
+
+
+"""-------------------- Database Router -------------------"""
+
+
+class GameShardRouter:
+    """
+    Sends Games, Boards and Players to the shard chosen for their game, and everything else
+    (the leaderboard, sessions, auth, admin) to the default database. Inside use_replicas, game
+    reads go to one of the shard's GAME_REPLICAS instead; writes always go to the primary.
+    """
+
+    @staticmethod
+    def is_sharded(app_label, model_name) -> bool:
+        return app_label == 'game' and model_name in SHARDED_MODELS
+
+    def shard_for(self, model, **hints):
+        if not self.is_sharded(model._meta.app_label, model._meta.model_name):
+            return 'default'
+
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._state.db is not None:
+                return instance._state.db
+            game_id = instance.pk if instance._meta.model_name == 'game' else getattr(instance, 'game_id', None)
+            if game_id is not None:
+                return shard_for_game(game_id)
+        return _current_shard.get()
+
+    def db_for_read(self, model, **hints):
+        alias = self.shard_for(model, **hints)
+        if _replica_reads.get() and self.is_sharded(model._meta.app_label, model._meta.model_name):
+            return replica_for(alias or 'default')
+        return alias
+
+    def db_for_write(self, model, **hints):
+        alias = self.shard_for(model, **hints)
+        return primary_for(alias) if alias is not None else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db is not None and obj2._state.db is not None:
+            return primary_for(obj1._state.db) == primary_for(obj2._state.db)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if primary_for(db) != db:
+            return False
+        if model_name is None:
+            return None
+        if self.is_sharded(app_label, model_name):
+            # A shard keeps its tables while it is left out of GAME_SHARDS, so its games can be moved off
+            return db in settings.GAME_SHARDS or db.startswith('shard_')
+        return db == 'default'
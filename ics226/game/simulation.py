@@ -0,0 +1,156 @@
+# game/simulation.py
+import numpy as np
+from .constants import BOARD_LENGTH, NUM_TREASURES, MIN_TREASURE, MAX_TREASURE, NUM_PLAYERS
+
+
+"""----------------- Generating Boards -----------------"""
+
+# Row and col offsets of UP, DOWN, LEFT and RIGHT, in that order.
+DIRECTIONS = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+UP_INDEX, DOWN_INDEX, LEFT_INDEX, RIGHT_INDEX = range(4)
+
+
+def generate_boards(rng, num_games, board_length=BOARD_LENGTH, num_treasures=NUM_TREASURES,
+                    min_treasure=MIN_TREASURE, max_treasure=MAX_TREASURE, num_players=NUM_PLAYERS) -> dict:
+    """
+    Generates many game-boards at once with the same placement rules as create_game: treasures
+    and players sit on distinct random tiles, and treasure values are drawn from
+    [min_treasure, max_treasure] until they are positive, since a zero-valued treasure is not
+    counted as treasure by populate_grid_with_treasure.
+    :param rng: The numpy Generator to draw from.
+    :param num_games: The number of boards to generate.
+    :return: A dict of arrays: 'treasure_pos' (games, treasures, 2), 'treasure_value'
+             (games, treasures) and 'player_pos' (games, players, 2).
+    :raises ValueError if no boards or no treasures are asked for, the board cannot hold every
+            treasure and player, or no positive treasure value can be drawn.
+    """
+    if num_games < 1:
+        raise ValueError('At least one game must be generated')
+    if num_treasures < 1:
+        raise ValueError('Every board must hold at least one treasure')
+    if num_treasures + num_players > board_length * board_length:
+        raise ValueError('Board is too small for every treasure and player')
+    if max_treasure < 1:
+        raise ValueError('MAX_TREASURE must be positive for treasure to be placed')
+
+    # Ranking random keys gives every board an independent uniformly random set of distinct tiles
+    keys = rng.random((num_games, board_length * board_length))
+    tiles = np.argpartition(keys, num_treasures + num_players - 1, axis=1)[:, :num_treasures + num_players]
+    positions = np.stack(np.divmod(tiles, board_length), axis=-1)
+
+    return {
+        'treasure_pos': positions[:, :num_treasures],
+        'treasure_value': rng.integers(max(min_treasure, 1), max_treasure + 1, size=(num_games, num_treasures)),
+        'player_pos': positions[:, num_treasures:],
+    }
+
+
+"""-------------------- Bot Policies -------------------"""
+
+
+def random_policy(rng, player_pos, treasure_pos, remaining) -> np.ndarray:
+    """
+    Moves in a random direction each turn.
+    :return: An array with one direction index per game.
+    """
+    return rng.integers(0, len(DIRECTIONS), size=len(player_pos))
+
+
+def greedy_policy(rng, player_pos, treasure_pos, remaining) -> np.ndarray:
+    """
+    Moves towards the nearest remaining treasure, closing the row distance before the col distance.
+    :return: An array with one direction index per game.
+    """
+    distance = np.abs(treasure_pos - player_pos[:, None, :]).sum(axis=-1)
+    distance = np.where(remaining, distance, np.iinfo(distance.dtype).max)
+    nearest = treasure_pos[np.arange(len(player_pos)), distance.argmin(axis=1)]
+    d_row, d_col = (nearest - player_pos).T
+
+    return np.select([d_row < 0, d_row > 0, d_col < 0], [UP_INDEX, DOWN_INDEX, LEFT_INDEX], default=RIGHT_INDEX)
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+}
+
+
+"""------------------- Playing Games -------------------"""
+
+
+def simulate_games(num_games, policies=('greedy', 'greedy'), max_turns=1000, seed=None, board_length=BOARD_LENGTH,
+                   num_treasures=NUM_TREASURES, min_treasure=MIN_TREASURE, max_treasure=MAX_TREASURE) -> dict:
+    """
+    Plays num_games games at once without touching the database. Players take turns in order,
+    each turn moving one tile as chosen by their policy; as in attempt_to_move_player, a move off
+    the board or onto another player is lost, and moving onto treasure collects it. A game ends
+    once all of its treasure has been collected or after max_turns turns.
+    :param num_games: The number of games to play.
+    :param policies: The name of each player's policy from POLICIES, which also sets the number of players.
+    :param max_turns: The number of turns after which an unfinished game is stopped.
+    :param seed: The seed for the random generator, for reproducible runs.
+    :return: A dict of arrays: 'scores' (games, players), 'turns' (games) and 'finished' (games).
+    :raises ValueError if the boards cannot be generated, as in generate_boards.
+    """
+    rng = np.random.default_rng(seed)
+    boards = generate_boards(rng, num_games, board_length, num_treasures, min_treasure, max_treasure, len(policies))
+    treasure_pos, treasure_value = boards['treasure_pos'], boards['treasure_value']
+    player_pos = boards['player_pos'].copy()
+
+    remaining = np.ones((num_games, num_treasures), dtype=bool)
+    scores = np.zeros((num_games, len(policies)), dtype=np.int64)
+    turns = np.full(num_games, max_turns)
+    active = np.ones(num_games, dtype=bool)
+
+    for turn in range(max_turns):
+        if not active.any():
+            break
+        player = turn % len(policies)
+        games = np.flatnonzero(active)
+        position = player_pos[games, player]
+
+        direction = POLICIES[policies[player]](rng, position, treasure_pos[games], remaining[games])
+        target = position + DIRECTIONS[direction]
+
+        on_board = ((target >= 0) & (target < board_length)).all(axis=1)
+        occupied = (player_pos[games] == target[:, None, :]).all(axis=-1).any(axis=1)
+        moved = on_board & ~occupied
+        player_pos[games[moved], player] = target[moved]
+
+        collected = remaining[games] & (treasure_pos[games] == target[:, None, :]).all(axis=-1) & moved[:, None]
+        scores[games, player] += (collected * treasure_value[games]).sum(axis=1)
+        remaining[games] &= ~collected
+
+        finished = games[~remaining[games].any(axis=1)]
+        turns[finished] = turn + 1
+        active[finished] = False
+
+    return {'scores': scores, 'turns': turns, 'finished': ~active}
+
+
+def summarize(results, percentiles=(5, 25, 50, 75, 95)) -> dict:
+    """
+    Summarizes simulated games into score and game-length statistics.
+    :param results: The dict returned by simulate_games.
+    :param percentiles: The percentiles to report.
+    :return: A dict of plain Python statistics, per player and for game length.
+    """
+    scores, turns, finished = results['scores'], results['turns'], results['finished']
+    best = scores.max(axis=1, keepdims=True)
+    sole_winner = (scores == best) & ((scores == best).sum(axis=1, keepdims=True) == 1)
+
+    def describe(values) -> dict:
+        if len(values) == 0:
+            return {}
+        stats = {'mean': float(values.mean()), 'std': float(values.std())}
+        stats.update({f'p{p}': float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))})
+        return stats
+
+    return {
+        'games': len(turns),
+        'finished_rate': float(finished.mean()),
+        'tie_rate': float((~sole_winner.any(axis=1)).mean()),
+        'players': [{'score': describe(scores[:, i]), 'win_rate': float(sole_winner[:, i].mean())}
+                    for i in range(scores.shape[1])],
+        'turns': describe(turns[finished]),
+    }
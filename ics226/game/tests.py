@@ -1,13 +1,58 @@
-from django.test import TestCase
-from .models import Player, Board
+import json
+from contextlib import ExitStack
+from io import StringIO
+from itertools import count as count_from, islice
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from random import Random
+import numpy as np
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from .models import Game, Player, Board, LeaderboardEntry
 from.constants import BOARD_LENGTH, NUM_TREASURES, MIN_TREASURE, MAX_TREASURE, PLAYER_ONE_NAME, PLAYER_TWO_NAME
-from .views import get_current_board_state
+from .views import get_current_board_state, make_player_token
+from .ratelimit import LocalBucketBackend, take_token
+from .profiling import summarize_profiles
+from .factories import build_game, generate_layout
+from .management.commands.rebalance_shards import move_game
+from .export import CSV_HEADER, iter_game_records
+from .simulation import generate_boards, simulate_games, summarize
+from .routers import GameShardRouter, PRIMARY_PIN_COOKIE, shard_for_game, use_game_shard, use_replicas
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 
+# Seed for the board layouts shared by each test class, so that every run plays the same boards
+GAME_SEED = 226
+
+
+# Tests that move games between shards need the spare shard added by ics226.test_settings
+requires_spare_shard = skipUnless('shard_spare' in settings.DATABASES, 'requires --settings=ics226.test_settings')
+
+
+def get_game_ids_on_shard(alias, count=1) -> [int]:
+    return list(islice((game_id for game_id in count_from(1) if shard_for_game(game_id) == alias), count))
+
+
+def create_game(client) -> Game:
+    response = client.post('/game/create/')
+    game_id = int(response.url.strip('/').split('/')[-1])
+    return Game.objects.using(shard_for_game(game_id)).get(id=game_id)
+
+
 class BoardTestCase(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = create_game(Client())
+
     def setUp(self):
-        self.client.post('/game/create/')
+        self.enterContext(use_game_shard(self.game.id))
 
     def test_correct_number_of_tiles(self):
         tile_count = len(Board.objects.all())
@@ -18,13 +63,13 @@ class BoardTestCase(TestCase):
         self.assertEquals(player_count, 2)
 
     def test_correct_number_of_treasure(self):
-        game_board = get_current_board_state()
+        game_board = get_current_board_state(self.game)
         treasure_tiles = [tile for row in game_board for tile in row if tile.value > 0]
         num_treasures = len(treasure_tiles)
         self.assertEquals(num_treasures, NUM_TREASURES)
 
     def test_correct_values_of_treasure(self):
-        game_board = get_current_board_state()
+        game_board = get_current_board_state(self.game)
         treasure_tiles = [tile for row in game_board for tile in row if tile.value > 0]
 
         for treasure_tile in treasure_tiles:
@@ -32,27 +77,35 @@ class BoardTestCase(TestCase):
                             f"Treasure value {treasure_tile.value} is not within the allowed range.")
 
 
+# These tests move players far faster than a person could, so the move rate limit is turned off
+@override_settings(GAME_MOVE_RATE=None)
 class GameplayTestCase(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = build_game(GAME_SEED)
+
     def setUp(self):
-        self.client.post('/game/create/')
+        self.enterContext(use_game_shard(self.game.id))
 
     def test_redirect_on_movement(self):
-        url = reverse('game:attempt_to_move_player')
-        response = self.client.post(url, {'player_name': PLAYER_ONE_NAME, 'direction': 'UP'})
+        url = reverse('game:attempt_to_move_player', kwargs={'game_id': self.game.id})
+        response = self.client.post(url, {'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'UP'})
         self.assertEqual(response.status_code, 302)
-        expected_redirect_url = reverse('game:display_and_play_game', kwargs={'name': PLAYER_ONE_NAME})
+        expected_redirect_url = reverse('game:display_and_play_game', kwargs={'game_id': self.game.id, 'name': PLAYER_ONE_NAME})
         self.assertRedirects(response, expected_redirect_url)
 
     def test_move_players_to_opposite_ends(self):
-        url = reverse('game:attempt_to_move_player')
+        url = reverse('game:attempt_to_move_player', kwargs={'game_id': self.game.id})
         for _ in range(20):
             # Move player 1 UP and LEFT
-            self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'UP'})
-            self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'LEFT'})
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'UP'})
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'LEFT'})
 
             # Move player 2 DOWN and RIGHT
-            self.client.post(url, data={'player_name': PLAYER_TWO_NAME, 'direction': 'DOWN'})
-            self.client.post(url, data={'player_name': PLAYER_TWO_NAME, 'direction': 'RIGHT'})
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_TWO_NAME), 'direction': 'DOWN'})
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_TWO_NAME), 'direction': 'RIGHT'})
 
         # Assert player 1 is at the top left of the board
         player1 = Player.objects.select_for_update().get(name=PLAYER_ONE_NAME)
@@ -66,46 +119,499 @@ class GameplayTestCase(TestCase):
 
 
     def test_collect_all_treasure_and_clear_treasure(self):
-        url = reverse('game:attempt_to_move_player')
+        url = reverse('game:attempt_to_move_player', kwargs={'game_id': self.game.id})
         
         # Delete Player 2
         Player.objects.filter(name=PLAYER_TWO_NAME).delete()
         
         # Move Player 1 all the way up and to the left
         for _ in range(BOARD_LENGTH):
-            self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'UP'})
-            self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'LEFT'})
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'UP'})
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'LEFT'})
 
         # Make Player 1 travel across every tile
         for _ in range(BOARD_LENGTH):
             for _ in range(BOARD_LENGTH):
-                self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'RIGHT'})  # Move all the way to the right
-            self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'DOWN'})       # Move down one
+                self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'RIGHT'})  # Move all the way to the right
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'DOWN'})       # Move down one
             for _ in range(BOARD_LENGTH):
-                self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'LEFT'})   # Move all the way to the left
-            self.client.post(url, data={'player_name': PLAYER_ONE_NAME, 'direction': 'DOWN'})  # Move down one
+                self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'LEFT'})   # Move all the way to the left
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'DOWN'})  # Move down one
 
         # Assert player 1 has picked up treasure
         player1 = Player.objects.select_for_update().get(name=PLAYER_ONE_NAME)
         self.assertGreater(player1.score, 0)
 
         # Assert that no treasure remains on the game board
-        game_board = get_current_board_state()
+        game_board = get_current_board_state(self.game)
         treasure_tiles = [tile for row in game_board for tile in row if tile.value > 0]
         self.assertEqual(len(treasure_tiles), 0)
 
 
+class LeaderboardTestCase(TestCase):
+    databases = '__all__'
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = build_game(GAME_SEED)
 
+    def setUp(self):
+        self.enterContext(use_game_shard(self.game.id))
 
+    def collect_treasure_with_player_one(self):
+        url = reverse('game:attempt_to_move_player', kwargs={'game_id': self.game.id})
+        Player.objects.filter(name=PLAYER_TWO_NAME).delete()
+        Board.objects.filter(value__gt=0).update(value=0)
+        player1 = Player.objects.get(name=PLAYER_ONE_NAME)
+        target_row = player1.row - 1 if player1.row > 0 else player1.row + 1
+        Board.objects.filter(row=target_row, col=player1.col).update(value=7)
+
+        direction = 'UP' if target_row < player1.row else 'DOWN'
+        with self.captureOnCommitCallbacks(using=shard_for_game(self.game.id), execute=True):
+            self.client.post(url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': direction})
+
+    def test_treasure_is_added_to_leaderboard(self):
+        self.collect_treasure_with_player_one()
+        entry = LeaderboardEntry.objects.get(name=PLAYER_ONE_NAME)
+        self.assertEqual(entry.total_treasure, 7)
+
+    def test_rolled_back_move_does_not_reach_leaderboard(self):
+        with self.assertRaises(RuntimeError), mock.patch('game.views.end_game', side_effect=RuntimeError):
+            self.collect_treasure_with_player_one()
+        self.assertFalse(LeaderboardEntry.objects.filter(name=PLAYER_ONE_NAME).exists())
+
+    def test_collecting_last_treasure_ends_game(self):
+        self.collect_treasure_with_player_one()
+        entry = LeaderboardEntry.objects.get(name=PLAYER_ONE_NAME)
+        self.assertEqual(entry.games_played, 1)
+        self.assertEqual(entry.best_score, 7)
+
+        # Starting a new game must not count the finished game a second time
+        self.client.post('/game/create/')
+        entry.refresh_from_db()
+        self.assertEqual(entry.games_played, 1)
+
+    def test_pages_and_ranks(self):
+        LeaderboardEntry.objects.all().delete()
+        for name, total in [('a', 30), ('b', 10), ('c', 20), ('d', 20)]:
+            LeaderboardEntry.objects.create(name=name, total_treasure=total)
+
+        first_page = LeaderboardEntry.top(2)
+        self.assertEqual([entry.name for entry in first_page], ['a', 'c'])
+        second_page = LeaderboardEntry.top(2, after=first_page[-1])
+        self.assertEqual([entry.name for entry in second_page], ['d', 'b'])
+        self.assertEqual(LeaderboardEntry.objects.get(name='d').rank(), 3)
+
+        response = self.client.get(reverse('game:leaderboard'), {'after': 'c', 'limit': 1})
+        self.assertEqual(response.context['ranked_entries'], [(3, second_page[0])])
+
+
+class ShardingTestCase(TestCase):
+    databases = '__all__'
+
+    def test_games_are_stored_on_their_shard(self):
+        for _ in range(4):
+            game = create_game(self.client)
+            shard = shard_for_game(game.id)
+            self.assertEqual(Board.objects.using(shard).filter(game=game).count(), BOARD_LENGTH * BOARD_LENGTH)
+            self.assertEqual(Player.objects.using(shard).filter(game=game).count(), 2)
+
+    @override_settings(GAME_SHARDS=['default', 'shard_1', 'shard_2'])
+    def test_adding_a_shard_only_moves_games_onto_it(self):
+        game_ids = range(1, 1001)
+        before = {game_id: shard_for_game(game_id) for game_id in game_ids}
+        self.assertEqual(set(before.values()), {'default', 'shard_1', 'shard_2'})
+
+        with self.settings(GAME_SHARDS=['default', 'shard_1', 'shard_2', 'shard_3']):
+            after = {game_id: shard_for_game(game_id) for game_id in game_ids}
+
+        moved = [game_id for game_id in game_ids if before[game_id] != after[game_id]]
+        self.assertTrue(moved)
+        self.assertTrue(all(after[game_id] == 'shard_3' for game_id in moved))
+
+    @requires_spare_shard
+    @override_settings(GAME_SHARDS=['default', 'shard_spare'])
+    def test_rebalance_moves_misplaced_games(self):
+        game = build_game(GAME_SEED)
+        home = shard_for_game(game.id)
+        other = next(alias for alias in settings.GAME_SHARDS if alias != home)
+
+        # Move the game away from its shard, then let the command bring it back
+        with self.settings(GAME_SHARDS=[other]):
+            call_command('rebalance_shards', stdout=StringIO())
+        self.assertFalse(Game.objects.using(home).filter(id=game.id).exists())
+
+        call_command('rebalance_shards', stdout=StringIO())
+        self.assertTrue(Game.objects.using(home).filter(id=game.id).exists())
+        self.assertEqual(Board.objects.using(home).filter(game=game).count(), BOARD_LENGTH * BOARD_LENGTH)
+        self.assertEqual(Board.objects.using(home).filter(game=game, player__isnull=False).count(), 2)
+
+    @requires_spare_shard
+    @override_settings(GAME_SHARDS=['default', 'shard_spare'])
+    def test_failed_delete_keeps_the_committed_copy(self):
+        game = build_game(GAME_SEED)
+        home = shard_for_game(game.id)
+        other = next(alias for alias in settings.GAME_SHARDS if alias != home)
+
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=[(0, {}), RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                move_game(game.id, home, other)
+        self.assertTrue(Game.objects.using(home).filter(id=game.id).exists())
+        self.assertEqual(Board.objects.using(other).filter(game=game).count(), BOARD_LENGTH * BOARD_LENGTH)
+
+
+class ReplicaRoutingTestCase(TestCase):
+    databases = '__all__'
+
+    @override_settings(GAME_SHARDS=['default'], GAME_REPLICAS={'default': ['default_replica_1']})
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        router = GameShardRouter()
+        with use_game_shard(1):
+            self.assertEqual(router.db_for_read(Board), 'default')
+            with use_replicas():
+                self.assertEqual(router.db_for_read(Board), 'default_replica_1')
+                self.assertEqual(router.db_for_write(Board), 'default')
+                self.assertEqual(router.db_for_read(LeaderboardEntry), 'default')
+
+            tile = Board(game_id=1)
+            tile._state.db = 'default_replica_1'
+            self.assertEqual(router.db_for_write(Board, instance=tile), 'default')
+        self.assertFalse(router.allow_migrate('default_replica_1', 'game', model_name='board'))
+
+    def test_player_is_pinned_to_primary_after_moving(self):
+        game = create_game(self.client)
+        self.assertIn(PRIMARY_PIN_COOKIE, self.client.cookies)
+
+        self.client.cookies.pop(PRIMARY_PIN_COOKIE)
+        url = reverse('game:attempt_to_move_player', kwargs={'game_id': game.id})
+        response = self.client.post(url, data={'player_token': make_player_token(game.id, PLAYER_ONE_NAME), 'direction': 'UP'})
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_display_views_render_without_locking(self):
+        game = build_game(GAME_SEED)
+        response = self.client.get(reverse('game:display', kwargs={'game_id': game.id}))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('game:display_and_play_game', kwargs={'game_id': game.id, 'name': PLAYER_ONE_NAME}))
+        self.assertEqual(response.status_code, 200)
+
+
+class ExportTestCase(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = sorted((build_game(seed) for seed in range(3)), key=lambda game: game.id)
+        cls.staff = User.objects.create_user('staff', is_staff=True)
 
+    def setUp(self):
+        self.client.force_login(self.staff)
 
+    def test_export_requires_staff(self):
+        self.client.logout()
+        response = self.client.get(reverse('game:export_games'))
+        self.assertEqual(response.status_code, 302)
 
+    def test_ndjson_export_streams_every_game(self):
+        response = self.client.get(reverse('game:export_games'))
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual({record['game_id'] for record in records}, {game.id for game in self.games})
+        for record in records:
+            self.assertEqual(len(record['board']), BOARD_LENGTH)
+            self.assertEqual(sum(row.count('$') for row in record['board']), NUM_TREASURES)
+            self.assertEqual([player['name'] for player in record['players']], [PLAYER_ONE_NAME, PLAYER_TWO_NAME])
+
+    def test_csv_export_filters_by_game_id(self):
+        response = self.client.get(reverse('game:export_games'),
+                                   {'format': 'csv', 'min_game_id': self.games[1].id, 'max_game_id': self.games[1].id})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), CSV_HEADER)
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line.startswith(str(self.games[1].id)) for line in lines[1:]))
+
+    def test_export_filters_by_date(self):
+        response = self.client.get(reverse('game:export_games'), {'until': '2000-01-01'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+        response = self.client.get(reverse('game:export_games'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command_reads_in_chunks(self):
+        records = list(iter_game_records(chunk_size=1))
+        self.assertEqual(len(records), len(self.games))
+
+        out = StringIO()
+        call_command('export_games', '--format', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), len(self.games))
+
+
+class SimulationTestCase(SimpleTestCase):
+    def test_boards_follow_placement_rules(self):
+        boards = generate_boards(np.random.default_rng(0), 500)
+        positions = np.concatenate([boards['treasure_pos'], boards['player_pos']], axis=1)
+        tiles = positions[..., 0] * BOARD_LENGTH + positions[..., 1]
+
+        self.assertTrue(all(len(set(row)) == tiles.shape[1] for row in tiles))
+        self.assertTrue(((positions >= 0) & (positions < BOARD_LENGTH)).all())
+        self.assertTrue(((boards['treasure_value'] >= max(MIN_TREASURE, 1)) & (boards['treasure_value'] <= MAX_TREASURE)).all())
+
+    def test_finished_games_collect_all_treasure(self):
+        results = simulate_games(200, ('greedy', 'greedy'), seed=1)
+        boards = generate_boards(np.random.default_rng(1), 200)
+        self.assertTrue(results['finished'].all())
+        np.testing.assert_array_equal(results['scores'].sum(axis=1), boards['treasure_value'].sum(axis=1))
+
+    def test_empty_simulations_are_rejected(self):
+        with self.assertRaises(ValueError):
+            simulate_games(10, num_treasures=0)
+        with self.assertRaises(ValueError):
+            simulate_games(0)
+
+    def test_simulation_is_reproducible(self):
+        first = summarize(simulate_games(100, ('random', 'greedy'), max_turns=200, seed=7))
+        second = summarize(simulate_games(100, ('random', 'greedy'), max_turns=200, seed=7))
+        self.assertEqual(first, second)
+
+
+class PlayerTokenTestCase(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = build_game(GAME_SEED)
+        cls.url = reverse('game:attempt_to_move_player', kwargs={'game_id': cls.game.id})
+
+    def test_play_page_issues_player_token(self):
+        response = self.client.get(reverse('game:display_and_play_game', kwargs={'game_id': self.game.id, 'name': PLAYER_ONE_NAME}))
+        self.assertContains(response, response.context['player_token'])
+        response = self.client.post(self.url, data={'player_token': response.context['player_token'], 'direction': 'UP'})
+        self.assertEqual(response.status_code, 302)
 
+    def test_move_is_rejected_without_valid_token(self):
+        for token in ['', 'forged', make_player_token(self.game.id + 1, PLAYER_ONE_NAME)]:
+            response = self.client.post(self.url, data={'player_token': token, 'direction': 'UP'})
+            self.assertEqual(response.status_code, 403)
+
+    def test_expired_token_reloads_play_page(self):
+        players = Player.objects.using(shard_for_game(self.game.id)).filter(game=self.game, name=PLAYER_ONE_NAME)
+        position = players.values_list('row', 'col').get()
+        token = make_player_token(self.game.id, PLAYER_ONE_NAME)
+        with self.settings(GAME_PLAYER_TOKEN_MAX_AGE=-1):
+            response = self.client.post(self.url, data={'player_token': token, 'direction': 'DOWN' if position[0] == 0 else 'UP'})
+        self.assertRedirects(response, reverse('game:display_and_play_game', kwargs={'game_id': self.game.id, 'name': PLAYER_ONE_NAME}))
+        self.assertEqual(players.values_list('row', 'col').get(), position)
+
+    def test_expired_token_for_another_game_is_rejected(self):
+        token = make_player_token(self.game.id + 1, PLAYER_ONE_NAME)
+        with self.settings(GAME_PLAYER_TOKEN_MAX_AGE=-1):
+            response = self.client.post(self.url, data={'player_token': token, 'direction': 'UP'})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(GAME_SERVER_TIMING=True, SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_server_timing_reports_queries(self):
+        response = self.client.post(self.url, data={'player_token': make_player_token(self.game.id, PLAYER_ONE_NAME), 'direction': 'UP'})
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('session;desc="0 queries"', response['Server-Timing'])
+
+
+class RateLimitTestCase(TestCase):
+    databases = '__all__'
+
+    def test_bucket_refills_over_time(self):
+        tokens, wait = take_token(0.5, updated_at=0, rate=2, burst=3, now=0)
+        self.assertEqual((tokens, wait), (0.5, 0.25))
+        tokens, wait = take_token(0.5, updated_at=0, rate=2, burst=3, now=10)
+        self.assertEqual((tokens, wait), (2, 0))
+
+    def test_local_backend_evicts_least_recently_used(self):
+        backend = LocalBucketBackend(max_buckets=2)
+        for key in ['a', 'b', 'a', 'c']:
+            backend.take(key, rate=1, burst=1, now=0)
+        self.assertEqual(list(backend.buckets), ['a', 'c'])
+
+    @override_settings(GAME_MOVE_RATE=1, GAME_MOVE_BURST=2)
+    def test_excess_moves_are_rejected_before_the_game_is_touched(self):
+        game = build_game(GAME_SEED)
+        url = reverse('game:attempt_to_move_player', kwargs={'game_id': game.id})
+        data = {'player_token': make_player_token(game.id, PLAYER_ONE_NAME), 'direction': 'UP'}
+
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        with self.assertNumQueries(0, using=shard_for_game(game.id)):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+        # The other player has their own bucket
+        data['player_token'] = make_player_token(game.id, PLAYER_TWO_NAME)
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+
+    @override_settings(GAME_MOVE_RATE=1, GAME_MOVE_BURST=1, GAME_MOVE_RATE_LIMIT_BACKEND='game.ratelimit.CacheBucketBackend')
+    def test_cache_backend_shares_buckets(self):
+        game = build_game(GAME_SEED)
+        url = reverse('game:attempt_to_move_player', kwargs={'game_id': game.id})
+        data = {'player_token': make_player_token(game.id, PLAYER_ONE_NAME), 'direction': 'UP'}
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.client.post(url, data).status_code, 429)
+
+
+class ProfilingTestCase(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = build_game(GAME_SEED)
+        cls.url = reverse('game:display', kwargs={'game_id': cls.game.id})
 
+    def setUp(self):
+        self.profile_dir = self.enterContext(TemporaryDirectory())
+
+    def profile_files(self):
+        return list(Path(self.profile_dir).glob('*.prof'))
+
+    def test_requests_are_not_profiled_by_default(self):
+        with self.settings(GAME_PROFILE_DIR=self.profile_dir, GAME_PROFILE_SAMPLE_RATE=0, GAME_PROFILE_SECRET=''):
+            self.client.get(self.url, HTTP_X_GAME_PROFILE='')
+        self.assertEqual(self.profile_files(), [])
+
+    def test_header_with_secret_triggers_profile(self):
+        with self.settings(GAME_PROFILE_DIR=self.profile_dir, GAME_PROFILE_SAMPLE_RATE=0, GAME_PROFILE_SECRET='s3cret'):
+            self.client.get(self.url, HTTP_X_GAME_PROFILE='wrong')
+            self.assertEqual(self.profile_files(), [])
+            response = self.client.get(self.url, HTTP_X_GAME_PROFILE='s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.profile_files()), 1)
+        self.assertIn('-display-', self.profile_files()[0].name)
+
+    def test_non_ascii_header_is_ignored(self):
+        with self.settings(GAME_PROFILE_DIR=self.profile_dir, GAME_PROFILE_SAMPLE_RATE=0, GAME_PROFILE_SECRET='s3cret'):
+            response = self.client.get(self.url, HTTP_X_GAME_PROFILE='é')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profile_files(), [])
+
+    def test_failing_view_is_profiled(self):
+        with self.settings(GAME_PROFILE_DIR=self.profile_dir, GAME_PROFILE_SAMPLE_RATE=1):
+            response = self.client.get(reverse('game:display', kwargs={'game_id': self.game.id + 1}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(self.profile_files()), 1)
+
+    def test_foreign_profile_files_are_skipped(self):
+        Path(self.profile_dir, 'manual.prof').touch()
+        with self.settings(GAME_PROFILE_DIR=self.profile_dir):
+            self.assertEqual(summarize_profiles(), [])
+
+    def test_oldest_profiles_are_deleted_and_listed_for_staff(self):
+        with self.settings(GAME_PROFILE_DIR=self.profile_dir, GAME_PROFILE_SAMPLE_RATE=1, GAME_PROFILE_MAX_FILES=2):
+            for _ in range(3):
+                self.client.get(self.url)
+            self.assertEqual(len(self.profile_files()), 2)
+
+            response = self.client.get(reverse('game:profiles'))
+            self.assertEqual(response.status_code, 302)
+
+            self.client.force_login(User.objects.create_user('staff', is_staff=True))
+            response = self.client.get(reverse('game:profiles'))
+        endpoint = response.context['endpoints'][0]
+        self.assertEqual((endpoint['endpoint'], endpoint['profiles']), ('display', 2))
+        self.assertTrue(endpoint['hot_functions'])
+
+
+class AdminTestCase(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = build_game(GAME_SEED)
+        cls.user = User.objects.create_superuser('admin')
 
-
-
-
-
-
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_counting_queries(self, url, params):
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            response = self.client.get(url, params)
+        return response, sum(len(queries) for queries in captured)
+
+    def test_board_changelist_does_not_query_per_row(self):
+        url = reverse('admin:game_board_changelist')
+        shard = shard_for_game(self.game.id)
+        one_row, one_row_queries = self.get_counting_queries(url, {'game': self.game.id, 'row': 0})
+        every_row, every_row_queries = self.get_counting_queries(url, {'game': self.game.id})
+        self.assertEqual(len(one_row.context['cl'].result_list), BOARD_LENGTH)
+        self.assertEqual(len(every_row.context['cl'].result_list), BOARD_LENGTH * BOARD_LENGTH)
+        self.assertEqual(every_row_queries, one_row_queries)
+
+    @requires_spare_shard
+    @override_settings(GAME_SHARDS=['default', 'shard_spare'])
+    def test_rows_listed_from_other_shards_cannot_be_changed(self):
+        url = reverse('admin:game_board_changelist')
+        response = self.client.get(url, {'shard': 'shard_spare'})
+        self.assertIsNone(response.context['cl'].list_display_links)
+        self.assertFalse(response.context['action_form'])
+        response = self.client.get(url)
+        self.assertTrue(response.context['cl'].list_display_links)
+
+        # Games keep a change view that reads them from their own shard
+        game = build_game(GAME_SEED, game_id=get_game_ids_on_shard('shard_spare')[0])
+        response = self.client.get(reverse('admin:game_game_change', args=[game.id]))
+        self.assertEqual(response.context['original'], game)
+
+    @requires_spare_shard
+    @override_settings(GAME_SHARDS=['default', 'shard_spare'])
+    def test_deleting_games_lists_rows_from_their_shard(self):
+        games = [build_game(GAME_SEED, game_id=game_id) for game_id in get_game_ids_on_shard('shard_spare', 2)]
+        response = self.client.post(reverse('admin:game_game_changelist') + '?shard=shard_spare',
+                                    {'action': 'delete_selected', '_selected_action': [game.id for game in games]})
+        self.assertEqual(dict(response.context['model_count']),
+                         {'games': 2, 'boards': 2 * BOARD_LENGTH * BOARD_LENGTH, 'players': 4})
+
+    def test_board_filters_and_player_search(self):
+        url = reverse('admin:game_board_changelist')
+        response = self.client.get(url, {'game': self.game.id, 'has_treasure': 'yes'})
+        self.assertEqual(response.context['cl'].result_count, NUM_TREASURES)
+        shard = shard_for_game(self.game.id)
+        response = self.client.get(url, {'game': self.game.id, 'row': 0, 'col': 0})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+        # Coordinates are only filtered within a game, where they are indexed
+        response = self.client.get(url, {'shard': shard, 'row': 0})
+        self.assertEqual(response.context['cl'].result_count, BOARD_LENGTH * BOARD_LENGTH)
+        response = self.client.get(url, {'shard': shard, 'q': PLAYER_ONE_NAME})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_large_filtered_changelists_use_plan_estimate(self):
+        url = reverse('admin:game_board_changelist')
+        with mock.patch('game.admin.estimate_query_count', return_value=10 ** 6):
+            response = self.client.get(url, {'game': self.game.id})
+        self.assertEqual(response.context['cl'].result_count, 10 ** 6)
+        with mock.patch('game.admin.estimate_query_count', return_value=10):
+            response = self.client.get(url, {'game': self.game.id})
+        self.assertEqual(response.context['cl'].result_count, BOARD_LENGTH * BOARD_LENGTH)
+
+    def test_player_changelist_search(self):
+        response = self.client.get(reverse('admin:game_player_changelist'), {'game': self.game.id, 'q': PLAYER_TWO_NAME})
+        self.assertEqual([player.name for player in response.context['cl'].result_list], [PLAYER_TWO_NAME])
+
+
+class FactoryTestCase(TestCase):
+    databases = '__all__'
+
+    def test_same_seed_gives_same_layout(self):
+        first, second = build_game(GAME_SEED), build_game(GAME_SEED)
+        layouts = [list(Board.objects.using(shard_for_game(game.id)).filter(game=game)
+                        .order_by('row', 'col').values_list('row', 'col', 'value', 'player__name'))
+                   for game in (first, second)]
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual(layouts[0], layouts[1])
+
+    def test_built_game_follows_placement_rules(self):
+        treasures, players = generate_layout(Random(GAME_SEED))
+        self.assertEqual(len(treasures), NUM_TREASURES)
+        self.assertTrue(all(max(MIN_TREASURE, 1) <= value <= MAX_TREASURE for value in treasures.values()))
+        self.assertFalse(set(treasures) & set(players.values()))
+
+        game = build_game(GAME_SEED)
+        with use_game_shard(game.id):
+            self.assertEqual(Board.objects.filter(game=game).count(), BOARD_LENGTH * BOARD_LENGTH)
+            for player in Player.objects.filter(game=game):
+                self.assertEqual(Board.objects.get(game=game, row=player.row, col=player.col).player, player)
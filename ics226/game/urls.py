@@ -4,10 +4,15 @@ from . import views
 app_name = 'game'
 
 urlpatterns = [
-    path('', views.display, name='display'),
+    path('', views.display_latest_game, name='display_latest_game'),
     path('create/', views.create_game, name='create_game'),
-    path('display/<str:name>/', views.display_and_play_game, name='display_and_play_game'),
-    path('move_player/', views.attempt_to_move_player, name='attempt_to_move_player'),
+    path('<int:game_id>/', views.display, name='display'),
+    path('<int:game_id>/display/<str:name>/', views.display_and_play_game, name='display_and_play_game'),
+    path('<int:game_id>/move_player/', views.attempt_to_move_player, name='attempt_to_move_player'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('leaderboard/<str:name>/', views.leaderboard_rank, name='leaderboard_rank'),
+    path('export/', views.export_games, name='export_games'),
+    path('profiles/', views.profiles, name='profiles'),
 ]
 
 
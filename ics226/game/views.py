@@ -1,127 +1,202 @@
 # game/views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, HttpResponseRedirect
-from .models import Board, Player
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseBadRequest, HttpResponseForbidden, Http404, StreamingHttpResponse
+from django.conf import settings
+from django.core import signing
+from django.contrib.admin.views.decorators import staff_member_required
+from .models import Game, Board, Player, LeaderboardEntry
+from .ratelimit import wait_before_move
+from .profiling import summarize_profiles
+from .export import EXPORT_FORMATS, iter_game_records, parse_export_filters
+from .routers import read_from_game_replica, pin_to_primary, shard_for_game, use_game_shard
 from django.db import transaction
 from random import randint
-from .constants import BOARD_LENGTH, NUM_TREASURES, MIN_TREASURE, MAX_TREASURE, NUM_PLAYERS, PLAYER_ONE_NAME, PLAYER_TWO_NAME, UP, DOWN, LEFT, RIGHT
+from functools import partial
+from math import ceil
+from .constants import BOARD_LENGTH, NUM_TREASURES, MIN_TREASURE, MAX_TREASURE, NUM_PLAYERS, PLAYER_ONE_NAME, PLAYER_TWO_NAME, UP, DOWN, LEFT, RIGHT, LEADERBOARD_PAGE_SIZE, MAX_LEADERBOARD_PAGE_SIZE
 
 
 """----------------- Create the Game-board -----------------"""
 
 
-def create_grid() -> None:
+def create_grid(game) -> None:
     """
     Creates a game grid by instantiating a collection of Board objects
     each with a row and a col coordinate.
+    :param game: The Game the grid belongs to.
     """
     for row in range(BOARD_LENGTH):
         for col in range(BOARD_LENGTH):
-            Board.create_board(row, col).save()
+            Board.create_board(game, row, col).save()
 
 
-def get_tile_free_of_treasure_and_player() -> Board:
+def get_tile_free_of_treasure_and_player(game) -> Board:
     """
     Returns a random Board that is free of both treasure and player.
+    :param game: The Game to pick a tile from.
     :return: A Board instance representing a tile without a treasure and player.
     """
     while True:
         row = randint(0, BOARD_LENGTH - 1)
         col = randint(0, BOARD_LENGTH - 1)
-        tile = Board.objects.select_for_update().get(row=row, col=col)
+        tile = Board.objects.select_for_update().get(game=game, row=row, col=col)
         if tile.value == 0 and tile.player is None:
             return tile
 
 
-def populate_grid_with_treasure() -> None:
+def populate_grid_with_treasure(game) -> None:
     """
     Populates the game grid with a specified number of treasures at random tiles.
+    :param game: The Game whose grid is populated.
     """
-    treasure_tiles = [tile for row in get_current_board_state() for tile in row if tile.value > 0]
+    treasure_tiles = [tile for row in get_current_board_state(game) for tile in row if tile.value > 0]
 
     while len(treasure_tiles) < NUM_TREASURES:
-        tile = get_tile_free_of_treasure_and_player()
+        tile = get_tile_free_of_treasure_and_player(game)
         tile.value = randint(MIN_TREASURE, MAX_TREASURE)
         tile.save()
-        treasure_tiles = [tile for row in get_current_board_state() for tile in row if tile.value > 0]
+        treasure_tiles = [tile for row in get_current_board_state(game) for tile in row if tile.value > 0]
 
 
-def populate_grid_with_players() -> None:
+def populate_grid_with_players(game) -> None:
     """
     Populates the game grid with a specified number of players at
     random positions on the game-board.
+    :param game: The Game whose grid is populated.
     """
     for i in range(NUM_PLAYERS):
         name = PLAYER_ONE_NAME if i == 0 else PLAYER_TWO_NAME
-        tile = get_tile_free_of_treasure_and_player()
-        tile.player = Player.create_player(name, tile.row, tile.col)
+        tile = get_tile_free_of_treasure_and_player(game)
+        tile.player = Player.create_player(game, name, tile.row, tile.col)
         tile.player.save()
         tile.save()
 
 
-@transaction.atomic
 def create_game(request) -> HttpResponse:
     """
     Creates a new game by initializing a game-board compromised of Boards,
-    populating it with treasure, and adds players.
+    populating it with treasure, and adds players. The game is stored on
+    the shard chosen for its id.
     :param request: The HTTP Request Object.
     :return HttpResponse redirecting to the game url.
     """
-    Board.objects.select_for_update().all().delete()   # Delete previous Game
-    Player.objects.select_for_update().all().delete()  # Delete previous Players
+    game = Game.create_game()
 
-    create_grid()                                       # Create the Grid
-    populate_grid_with_treasure()                       # Fill grid with Treasure
-    populate_grid_with_players()                        # Fill grid with Players
-    return HttpResponseRedirect(redirect_to='/game/')   # Redirect to select player screen
+    with use_game_shard(game.id), transaction.atomic(using=shard_for_game(game.id)):
+        game.save()                                     # Create the Game
+        create_grid(game)                               # Create the Grid
+        populate_grid_with_treasure(game)               # Fill grid with Treasure
+        populate_grid_with_players(game)                # Fill grid with Players
+
+    response = redirect('game:display', game_id=game.id)  # Redirect to select player screen
+    pin_to_primary(response)                              # Read the new game back from the primary
+    return response
+
+
+def display_latest_game(request) -> HttpResponse:
+    """
+    Redirects to the most recently created game across every shard.
+    :param request: The HTTP Request Object.
+    :return: HttpResponse redirecting to the latest game.
+    """
+    latest_games = [Game.objects.using(alias).order_by('-created_at').first() for alias in settings.GAME_SHARDS]
+    latest_games = [game for game in latest_games if game is not None]
+    if not latest_games:
+        raise Http404('No game has been created yet.')
+
+    latest_game = max(latest_games, key=lambda game: game.created_at)
+    return redirect('game:display', game_id=latest_game.id)
 
 
 """-------------------- User Interface --------------------"""
 
 
-def get_current_board_state() -> [[Board]]:
+def get_current_board_state(game, for_update=True) -> [[Board]]:
     """
     Retrieves the current state of the Board by creating a 2D array of Board objects that represent
     the Game-board.
+    :param game: The Game whose board is retrieved.
+    :param for_update: False to read the board without locking it, e.g. for display only.
     :return: The 2D Array of Board Objects representing the current state of the game-board.
     """
+    tiles = Board.objects.select_for_update() if for_update else Board.objects.all()
     # board_state = [[tile for tile in Board.objects.select_for_update().filter(row=i)] for i in range(0, BOARD_LENGTH)]
-    board_state = [[tile for tile in Board.objects.select_for_update().filter(row=i).order_by('col')] for i in range(0, BOARD_LENGTH)]
+    # The whole board is read in one query and split into rows
+    tiles = list(tiles.filter(game=game).order_by('row', 'col'))
+    board_state = [tiles[i * BOARD_LENGTH:(i + 1) * BOARD_LENGTH] for i in range(0, BOARD_LENGTH)]
     return board_state
 
 
-@transaction.atomic
-def display(request) -> HttpResponse:
+@read_from_game_replica
+def display(request, game_id) -> HttpResponse:
     """
     Retrieves the game-board and players and renders them onto the screen with the option to
-    select a player.
+    select a player. Only reads are made, so they may be served by a replica.
     :param request: The HTTP Request Object.
+    :param game_id: The id of the game to display.
     :return: HttpResponse returned implicitly via the django render function.
     """
-    board = get_current_board_state()
-    players = Player.objects.select_for_update().all()
-    context = {'board': board, 'players': players}
+    game = get_object_or_404(Game, id=game_id)
+    board = get_current_board_state(game, for_update=False)
+    players = Player.objects.filter(game=game).order_by('name')
+    context = {'game': game, 'board': board, 'players': players}
     return render(request, 'game/game_board.html', context)
 
 
-@transaction.atomic
-def display_and_play_game(request, name):
+@read_from_game_replica
+def display_and_play_game(request, game_id, name):
     """
     Retrieves the game-board and players and renders them onto the screen from the perspective
     of a single player. The player's scores and opponent player score is also rendered onto the screen.
+    Only reads are made, so they may be served by a replica.
     :param request: The HTTP Request Object.
+    :param game_id: The id of the game being played.
     :param name: The name of the player who was selected.
     :return: HTTPResponse returned implicitly via the django render function.
     """
-    board = get_current_board_state()
-    curr_player = get_object_or_404(Player.objects.select_for_update(), name=name)
-    opponent_player = get_object_or_404(Player.objects.select_for_update(), name=PLAYER_TWO_NAME if name == PLAYER_ONE_NAME else PLAYER_ONE_NAME)
-    context = {'board': board, 'curr_player': curr_player, 'opponent_player': opponent_player}
+    game = get_object_or_404(Game, id=game_id)
+    board = get_current_board_state(game, for_update=False)
+    curr_player = get_object_or_404(Player, game=game, name=name)
+    opponent_player = get_object_or_404(Player, game=game, name=PLAYER_TWO_NAME if name == PLAYER_ONE_NAME else PLAYER_ONE_NAME)
+    player_token = make_player_token(game.id, curr_player.name)
+    context = {'game': game, 'board': board, 'curr_player': curr_player, 'opponent_player': opponent_player,
+               'player_token': player_token}
     return render(request, 'game/play_game.html', context)
 
 
 """ ------------------ Moving a Player ------------------- """
 
+PLAYER_TOKEN_SALT = 'game.player'
+
+
+def make_player_token(game_id, name) -> str:
+    """
+    Signs a reference to a player's seat in a game, so that moves cannot be sent for a tampered
+    game id or player name. It does not authenticate the client: anyone who opens the play page
+    for a seat is given that seat's token.
+    :param game_id: The id of the game the player is in.
+    :param name: The name of the player.
+    :return: A signed, timestamped token.
+    """
+    return signing.dumps([game_id, name], salt=PLAYER_TOKEN_SALT)
+
+
+def read_player_token(token, game_id, check_age=True) -> str:
+    """
+    Verifies a player token issued by make_player_token for the given game.
+    :param token: The token sent with the move.
+    :param game_id: The id of the game the move is made in.
+    :param check_age: False to accept a token older than GAME_PLAYER_TOKEN_MAX_AGE.
+    :return: The name of the player the token was issued to.
+    :raises SignatureExpired if the token is older than GAME_PLAYER_TOKEN_MAX_AGE.
+    :raises BadSignature if the token is forged or was issued for another game.
+    """
+    max_age = settings.GAME_PLAYER_TOKEN_MAX_AGE if check_age else None
+    token_game_id, name = signing.loads(token or '', salt=PLAYER_TOKEN_SALT, max_age=max_age)
+    if token_game_id != game_id:
+        raise signing.BadSignature('Player token was issued for another game')
+    return name
+
 
 def validate_movement(player, direction, board) -> bool:
     """
@@ -171,7 +246,8 @@ def move_player(player, movement, board) -> None:
 
 def collect_treasure(player, board) -> None:
     """
-    Collects treasure on the game board at the player's current position.
+    Collects treasure on the game board at the player's current position. The treasure is added
+    to the leaderboard only once the move's transaction on the game's shard commits.
     :param player: The player collecting treasure.
     :param board: The current state of the game board.
     """
@@ -183,28 +259,183 @@ def collect_treasure(player, board) -> None:
         player.save()
         board[player.row][player.col].value = 0
         board[player.row][player.col].save()
+        transaction.on_commit(partial(LeaderboardEntry.add_treasure, player.name, treasure),
+                              using=shard_for_game(player.game_id))
 
 
-@transaction.atomic
-def attempt_to_move_player(request) -> HttpResponse:
+def has_remaining_treasure(board) -> bool:
+    """
+    Checks whether any tile on the game board still holds treasure.
+    :param board: The current state of the game board.
+    :return: True if at least one tile holds treasure, False otherwise.
+    """
+    return any(tile.value > 0 for row in board for tile in row)
+
+
+def end_game(game) -> None:
+    """
+    Ends a game by recording every player's final score on the leaderboard once the game's
+    shard commits, so a rolled back move never reaches the leaderboard on the default database.
+    :param game: The Game that has ended.
+    """
+    for player in Player.objects.select_for_update().filter(game=game):
+        transaction.on_commit(partial(LeaderboardEntry.record_game, player.name, player.score),
+                              using=shard_for_game(game.id))
+
+
+def play_move(game_id, player_name, movement) -> None:
+    """
+    Moves a player inside a transaction on the game's shard, collecting any treasure they land on.
+    :param game_id: The id of the game being played.
+    :param player_name: The name of the player to move.
+    :param movement: The direction in which the player wants to move ('UP', 'DOWN', 'LEFT', 'RIGHT').
+    """
+    with use_game_shard(game_id), transaction.atomic(using=shard_for_game(game_id)):
+        # Get the player and current board state from the database
+        game = get_object_or_404(Game, id=game_id)
+        player = get_object_or_404(Player, game=game, name=player_name)
+        board = get_current_board_state(game)
+
+        # Validate the player's movement and update the game state if valid
+        if validate_movement(player, movement, board):
+            move_player(player, movement, board)
+            had_treasure = has_remaining_treasure(board)
+            collect_treasure(player, board)
+
+            # The game ends once the last treasure has been collected
+            if had_treasure and not has_remaining_treasure(board):
+                end_game(game)
+
+
+def attempt_to_move_player(request, game_id) -> HttpResponse:
     """
     Handles the attempt to move the player based on the provided POST data,
     updates the game state, and redirects to the display_and_play_game view.
+    The player is identified by the signed token issued by display_and_play_game,
+    and both the token and the player's move rate limit are checked before any
+    transaction is opened.
     :param request: The HTTP Request object
-    :return: Redirect to 'display_and_play_game' view with the updated player state
+    :param game_id: The id of the game being played.
+    :return: Redirect to 'display_and_play_game' view with the updated player state, or
+             without moving if the player token has expired, HttpResponseForbidden if the
+             player token is invalid, or a 429 response if the player is moving too quickly.
     """
-    # Retrieve player name and movement direction from POST data
-    player_name = request.POST.get('player_name')
+    # Retrieve player identity and movement direction from POST data
+    try:
+        player_name = read_player_token(request.POST.get('player_token'), game_id)
+    except signing.SignatureExpired:
+        # The play page was left open too long, so reload it with a fresh token
+        try:
+            player_name = read_player_token(request.POST.get('player_token'), game_id, check_age=False)
+        except signing.BadSignature:
+            return HttpResponseForbidden('Invalid player token.')
+        return redirect('game:display_and_play_game', game_id=game_id, name=player_name)
+    except signing.BadSignature:
+        return HttpResponseForbidden('Invalid player token.')
     movement = request.POST.get('direction')
 
-    # Get the player and current board state from the database
-    player = get_object_or_404(Player, name=player_name)
-    board = get_current_board_state()
+    # Reject the move if the player has used up their move allowance
+    wait = wait_before_move(game_id, player_name)
+    if wait > 0:
+        response = HttpResponse('Too many moves, slow down.', status=429)
+        response['Retry-After'] = str(ceil(wait))
+        return response
+
+    play_move(game_id, player_name, movement)
+
+    # Redirect to the 'display_and_play_game' view with the updated player state, read from the primary
+    response = redirect('game:display_and_play_game', game_id=game_id, name=player_name)
+    pin_to_primary(response)
+    return response
+
 
-    # Validate the player's movement and update the game state if valid
-    if validate_movement(player, movement, board):
-        move_player(player, movement, board)
-        collect_treasure(player, board)
+""" -------------------- Leaderboard --------------------- """
 
-    # Redirect to the 'display_and_play_game' view with the updated player state
-    return redirect('game:display_and_play_game', name=player_name)
+
+def get_page_size(request) -> int:
+    """
+    Reads the requested page size from the query string, falling back to the default page size.
+    :param request: The HTTP Request Object.
+    :return: The number of leaderboard entries to show, capped at MAX_LEADERBOARD_PAGE_SIZE.
+    """
+    try:
+        limit = int(request.GET.get('limit', LEADERBOARD_PAGE_SIZE))
+    except ValueError:
+        limit = LEADERBOARD_PAGE_SIZE
+    return max(1, min(limit, MAX_LEADERBOARD_PAGE_SIZE))
+
+
+def leaderboard(request) -> HttpResponse:
+    """
+    Renders a page of the cross-game seat leaderboard. The page following a given seat is
+    requested with the 'after' query parameter.
+    :param request: The HTTP Request Object.
+    :return: HttpResponse returned implicitly via the django render function.
+    """
+    limit = get_page_size(request)
+    after_name = request.GET.get('after')
+    after = get_object_or_404(LeaderboardEntry, name=after_name) if after_name else None
+    first_rank = after.rank() + 1 if after is not None else 1
+
+    entries = LeaderboardEntry.top(limit + 1, after=after)
+    next_entry = entries[limit - 1] if len(entries) > limit else None
+    entries = entries[:limit]
+
+    ranked_entries = [(first_rank + i, entry) for i, entry in enumerate(entries)]
+    context = {'ranked_entries': ranked_entries, 'next_entry': next_entry, 'limit': limit}
+    return render(request, 'game/leaderboard.html', context)
+
+
+def leaderboard_rank(request, name) -> HttpResponse:
+    """
+    Renders a single seat's leaderboard totals along with its rank.
+    :param request: The HTTP Request Object.
+    :param name: The name of the seat to look up.
+    :return: HttpResponse returned implicitly via the django render function.
+    """
+    entry = get_object_or_404(LeaderboardEntry, name=name)
+    context = {'entry': entry, 'rank': entry.rank()}
+    return render(request, 'game/leaderboard_rank.html', context)
+
+
+""" ----------------------- Export ----------------------- """
+
+
+@staff_member_required
+def export_games(request) -> HttpResponse:
+    """
+    Streams every game with its players, scores and final board as NDJSON or CSV. The query
+    parameter 'format' selects the format, and 'since' and 'until' restrict the export to a
+    creation date range, which is the cursor for incremental pulls. 'min_game_id' and
+    'max_game_id' select a game id range; ids are random, so new games land anywhere in it.
+    :param request: The HTTP Request Object.
+    :return: StreamingHttpResponse of the export, or HttpResponseBadRequest for invalid parameters.
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f'Unknown format: {export_format}')
+
+    try:
+        filters = parse_export_filters(request.GET.get('since'), request.GET.get('until'),
+                                       request.GET.get('min_game_id'), request.GET.get('max_game_id'))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    render_records, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(render_records(iter_game_records(**filters)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="games.{export_format}"'
+    return response
+
+
+""" ---------------------- Profiling --------------------- """
+
+
+@staff_member_required
+def profiles(request) -> HttpResponse:
+    """
+    Lists the hot functions of each profiled game endpoint, combined over its stored profiles.
+    :param request: The HTTP Request Object.
+    :return: HttpResponse returned implicitly via the django render function.
+    """
+    context = {'endpoints': summarize_profiles()}
+    return render(request, 'game/profiles.html', context)
@@ -12,7 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 from os import environ, path
-from dj_database_url import config
+from tempfile import gettempdir
+from dj_database_url import config, parse
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'game.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'game.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'ics226.urls'
@@ -88,6 +91,54 @@ DATABASES = {
 }
 
 
+# Caches and sessions
+# Sessions are stored in the database by default. GAME_SESSION_BACKEND='cache' or 'signed_cookies'
+# keeps session reads and writes off the database; the game views themselves identify players with
+# signed seat tokens (GAME_PLAYER_TOKEN_MAX_AGE seconds) and CSRF tokens are kept in a cookie, so
+# neither needs a session lookup. REDIS_URL shares the cache between processes.
+
+if environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': environ['REDIS_URL'],
+        }
+    }
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[environ.get('GAME_SESSION_BACKEND', 'db')]
+
+GAME_PLAYER_TOKEN_MAX_AGE = int(environ.get('GAME_PLAYER_TOKEN_MAX_AGE', str(60 * 60 * 24)))
+
+# Moves are limited per player with a token bucket (see game/ratelimit.py): GAME_MOVE_RATE moves
+# per second on average, in bursts of up to GAME_MOVE_BURST. Faster moves are rejected with a 429
+# before any database work. Buckets are kept in process memory unless GAME_MOVE_RATE_LIMIT_BACKEND
+# is 'game.ratelimit.CacheBucketBackend', which shares them through the cache. A GAME_MOVE_RATE of
+# 0 turns the limit off.
+
+GAME_MOVE_RATE = float(environ.get('GAME_MOVE_RATE', '10')) or None
+GAME_MOVE_BURST = int(environ.get('GAME_MOVE_BURST', '20'))
+GAME_MOVE_RATE_LIMIT_BACKEND = environ.get('GAME_MOVE_RATE_LIMIT_BACKEND', 'game.ratelimit.LocalBucketBackend')
+
+# Game views are profiled with cProfile for a GAME_PROFILE_SAMPLE_RATE share of requests, and for
+# any request with an X-Game-Profile header equal to GAME_PROFILE_SECRET (see game/profiling.py).
+# The newest GAME_PROFILE_MAX_FILES profiles are kept in GAME_PROFILE_DIR and summarized for staff
+# at /game/profiles/.
+
+GAME_PROFILE_SAMPLE_RATE = float(environ.get('GAME_PROFILE_SAMPLE_RATE', '0'))
+GAME_PROFILE_SECRET = environ.get('GAME_PROFILE_SECRET', '')
+GAME_PROFILE_DIR = environ.get('GAME_PROFILE_DIR', path.join(gettempdir(), 'ics226-profiles'))
+GAME_PROFILE_MAX_FILES = int(environ.get('GAME_PROFILE_MAX_FILES', '200'))
+
+# Set GAME_SERVER_TIMING to add a Server-Timing header with the time and database queries of
+# each request, including those made for sessions.
+GAME_SERVER_TIMING = bool(environ.get('GAME_SERVER_TIMING'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -138,4 +189,43 @@ if not DEBUG:
     STATIC_ROOT = path.join(BASE_DIR, 'staticfiles')
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+
+# Game shards
+# Every game, along with its board and players, is stored on one of GAME_SHARDS, chosen by
+# hashing the game id (see game/routers.py). Everything else stays on the default database.
+# GAME_SHARD_DATABASE_URLS adds comma-separated database urls as extra shards; otherwise
+# GAME_SHARD_COUNT spreads games over that many local SQLite files.
+
+GAME_SHARDS = ['default']
+
+GAME_SHARD_DATABASE_URLS = [url for url in environ.get('GAME_SHARD_DATABASE_URLS', '').split(',') if url]
+if GAME_SHARD_DATABASE_URLS:
+    for i, url in enumerate(GAME_SHARD_DATABASE_URLS, start=1):
+        DATABASES[f'shard_{i}'] = parse(url, conn_max_age=600)
+else:
+    for i in range(1, int(environ.get('GAME_SHARD_COUNT', '1'))):
+        DATABASES[f'shard_{i}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'db_shard_{i}.sqlite3',
+        }
+
+GAME_SHARDS += [alias for alias in DATABASES if alias.startswith('shard_')]
+
+
+# Read replicas
+# Read-only game views may read from a replica of the game's shard (see game/routers.py). A client
+# that has just written to a game reads from the primary for GAME_REPLICA_PIN_SECONDS afterwards.
+# GAME_REPLICA_DATABASE_URLS adds comma-separated database urls as replicas of the default
+# database. Replicas of other shards can be added to DATABASES and listed in GAME_REPLICAS.
+
+GAME_REPLICAS = {}
+GAME_REPLICA_PIN_SECONDS = int(environ.get('GAME_REPLICA_PIN_SECONDS', '5'))
+
+GAME_REPLICA_DATABASE_URLS = [url for url in environ.get('GAME_REPLICA_DATABASE_URLS', '').split(',') if url]
+for i, url in enumerate(GAME_REPLICA_DATABASE_URLS, start=1):
+    DATABASES[f'default_replica_{i}'] = parse(url, conn_max_age=600, test_options={'MIRROR': 'default'})
+    GAME_REPLICAS.setdefault('default', []).append(f'default_replica_{i}')
+
+DATABASE_ROUTERS = ['game.routers.GameShardRouter']
+
 DEBUG = True
@@ -0,0 +1,15 @@
+"""
+Django settings for running the ics226 test suite:
+
+    python manage.py test game --settings=ics226.test_settings
+
+These add a spare shard that is not listed in GAME_SHARDS, which tests add with override_settings
+to move games between shards whatever GAME_SHARD_COUNT is.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES['shard_spare'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db_shard_spare.sqlite3',
+}